@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Category, Location, Post, Comment
+from .search import search_posts
 
 admin.site.empty_value_display = "Не задано"
 
@@ -30,6 +31,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("is_published",)
     list_display_links = ("title",)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -0,0 +1,256 @@
+import math
+from functools import wraps
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import condition
+
+from .models import Category, Post
+
+FEED_COUNT_TIMEOUT = 60
+FEED_PAGE_TIMEOUT = 60 * 5
+
+INDEX_FEED = "index"
+ALL_FEEDS = "*"
+
+
+def category_feed(category_slug):
+    return f"category:{category_slug}"
+
+
+def post_feed(pk):
+    return f"post:{pk}"
+
+
+def author_feed(username, include_hidden=False):
+    if include_hidden:
+        return f"author:{username}:all"
+    return f"author:{username}"
+
+
+def feed_filters(feed):
+    """Return lookups selecting the posts of a time-dependent feed.
+
+    ``None`` means the feed does not depend on the clock: a single post
+    page, or an author looking at all of their own posts.
+    """
+    kind, _, value = feed.partition(":")
+    if kind == "post":
+        return None
+    if kind == "category":
+        return {"category__slug": value}
+    if kind == "author":
+        username, _, scope = value.partition(":")
+        return None if scope else {"author__username": username}
+    return {}
+
+
+def feed_timeout(feed, timeout):
+    """Shorten ``timeout`` so the cache expires when a post gets published.
+
+    Scheduled posts become visible the moment ``pub_date`` passes, so a
+    cached feed must not outlive the earliest upcoming publication.
+    """
+    filters = feed_filters(feed)
+    if filters is None:
+        return timeout
+    now = timezone.now()
+    next_pub_date = (
+        Post.objects.filter(is_visible=True, pub_date__gt=now, **filters)
+        .order_by("pub_date")
+        .values_list("pub_date", flat=True)
+        .first()
+    )
+    if next_pub_date is None:
+        return timeout
+    seconds = math.ceil((next_pub_date - now).total_seconds())
+    return max(1, min(timeout, seconds))
+
+
+def feed_count_key(feed):
+    return f"blog:feed-count:{feed}"
+
+
+def post_feeds(username, category_slugs, post_id=None):
+    feeds = [INDEX_FEED]
+    if post_id is not None:
+        feeds.append(post_feed(post_id))
+    if username is not None:
+        feeds += [author_feed(username), author_feed(username, True)]
+    feeds += [category_feed(slug) for slug in category_slugs if slug]
+    return feeds
+
+
+def saved_post_feeds(post_id):
+    """Feeds showing the post as it is stored now."""
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values_list("author__username", "category__slug")
+        .first()
+    )
+    if post is None:
+        return []
+    username, slug = post
+    return post_feeds(username, {slug}, post_id)
+
+
+def invalidate_feeds(feeds):
+    """Drop cached counts and anonymous pages of the given feeds."""
+    feeds = list(feeds)
+    cache.delete_many([feed_count_key(feed) for feed in feeds])
+    for feed in feeds:
+        bump_version("feed", feed)
+
+
+def invalidate_all_feeds():
+    """Drop every feed cache, after bulk writes that bypass the signals."""
+    usernames = (
+        Post.objects.order_by()
+        .values_list("author__username", flat=True)
+        .distinct()
+    )
+    invalidate_feeds(
+        [ALL_FEEDS, INDEX_FEED]
+        + [
+            category_feed(slug)
+            for slug in Category.objects.values_list("slug", flat=True)
+        ]
+        + [
+            feed
+            for username in usernames
+            if username is not None
+            for feed in (author_feed(username), author_feed(username, True))
+        ]
+    )
+
+
+def version_key(kind, pk):
+    return f"blog:version:{kind}:{pk}"
+
+
+def bump_version(kind, pk):
+    cache.set(version_key(kind, pk), uuid4().hex, None)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def attach_card_versions(posts):
+    """Give every post a ``card_version`` for the post card fragment cache.
+
+    The version changes whenever the post, its author, category or
+    location is saved, or its comment counter moves.
+    """
+    posts = list(posts)
+    related = {
+        post.pk: (
+            version_key("post", post.pk),
+            version_key("user", post.author_id),
+            version_key("category", post.category_id),
+            version_key("location", post.location_id),
+        )
+        for post in posts
+    }
+    versions = get_versions({key for keys in related.values() for key in keys})
+    for post in posts:
+        post.card_version = ".".join(
+            [versions[key] for key in related[post.pk]]
+            + [str(post.comment_count)]
+        )
+
+
+def feed_versions(*feeds):
+    keys = [version_key("feed", feed) for feed in (ALL_FEEDS,) + feeds]
+    versions = get_versions(keys)
+    return [versions[key] for key in keys]
+
+
+def page_cache_key(feed, path):
+    path_hash = md5(path.encode()).hexdigest()
+    return "blog:page:{}:{}:{}".format(
+        feed, ".".join(feed_versions(feed)), path_hash
+    )
+
+
+def cache_anonymous_page(get_feed):
+    """Serve whole responses of a feed view to anonymous readers from cache.
+
+    ``get_feed`` maps the view's URL kwargs to the feed the page belongs
+    to; bumping that feed with ``invalidate_feeds`` drops all its pages.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+            ):
+                return view_func(request, *args, **kwargs)
+            key = page_cache_key(get_feed(**kwargs), request.get_full_path())
+            response = cache.get(key)
+            if response is not None:
+                return get_conditional_response(
+                    request,
+                    etag=response.get("ETag"),
+                    last_modified=parse_http_date_safe(
+                        response.get("Last-Modified")
+                    ),
+                    response=response,
+                )
+            # Taken before rendering: a post going live during it must
+            # end the cached page's life, not be left out of it.
+            timeout = feed_timeout(get_feed(**kwargs), FEED_PAGE_TIMEOUT)
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            if getattr(response, "is_rendered", True):
+                cache.set(key, response, timeout)
+            else:
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, rendered, timeout)
+                )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_page(get_state):
+    """Answer conditional GETs of a view from a summary of its content.
+
+    ``get_state(request, **kwargs)`` returns ``(parts, last_modified)``
+    where ``parts`` changes whenever the rendered page would, or ``None``
+    when the view is going to respond with an error anyway.
+    """
+
+    def state(request, **kwargs):
+        if not hasattr(request, "_page_state"):
+            request._page_state = get_state(request, **kwargs)
+        return request._page_state
+
+    def etag(request, *args, **kwargs):
+        page_state = state(request, **kwargs)
+        if page_state is None:
+            return None
+        viewer = None
+        if request.user.is_authenticated:
+            viewer = (request.user.pk, request.META.get("CSRF_COOKIE"))
+        return md5(repr((page_state[0], viewer)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        page_state = state(request, **kwargs)
+        return page_state and page_state[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
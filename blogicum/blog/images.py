@@ -0,0 +1,219 @@
+import posixpath
+from base64 import b64encode
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter, ImageOps
+
+# Cards and the post page are 40rem wide: one and two pixels per CSS
+# pixel, plus smaller screens.
+RENDITION_WIDTHS = (320, 640, 960, 1280)
+
+FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+# Anything else, such as GIF or BMP, is resized into a PNG.
+FALLBACK_FORMAT = "PNG"
+# Offered to browsers in this order, so the smallest comes first.
+MODERN_FORMATS = ("AVIF", "WEBP")
+EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "AVIF": ".avif",
+}
+MIME_TYPES = {"WEBP": "image/webp", "AVIF": "image/avif"}
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 4},
+    "AVIF": {"quality": 55, "speed": 6},
+}
+# The blurred placeholder shown while the image loads: a few pixels wide,
+# a couple of hundred bytes inline in the page.
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_BLUR = 1
+PLACEHOLDER_QUALITY = 40
+# Dominant colour: the largest cluster among a few colours of a thumbnail.
+COLOR_SAMPLE_SIZE = 64
+COLOR_CLUSTERS = 5
+# What Pillow raises on a broken or hostile upload.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+# EXIF orientations that turn the picture on its side.
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+ORIENTATION_TAG = 0x0112
+
+
+def modern_formats():
+    """The modern formats this Pillow build can write; AVIF needs
+    Pillow 11.2 or a plugin."""
+    Image.init()
+    return [
+        image_format
+        for image_format in MODERN_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def rendition_format(name):
+    extension = posixpath.splitext(name)[1].lower()
+    return FORMATS.get(extension, FALLBACK_FORMAT)
+
+
+def rendition_name(name, width, image_format=None):
+    """Name of a copy stored next to the original, ``a.640w.jpg`` or
+    ``a.640w.webp`` for ``a.jpg``."""
+    stem = posixpath.splitext(name)[0]
+    image_format = image_format or rendition_format(name)
+    return f"{stem}.{width}w{EXTENSIONS[image_format]}"
+
+
+def rendition_widths(original_width):
+    """Widths offered in ``srcset``: the standard ones narrower than the
+    original, then the original's own unless it is wider still."""
+    widths = [width for width in RENDITION_WIDTHS if width < original_width]
+    widths.append(min(original_width, RENDITION_WIDTHS[-1]))
+    return widths
+
+
+def rendition_names(name, renditions):
+    """Names of every copy ``make_renditions`` wrote for the image."""
+    names = []
+    for width in renditions.get("widths", ()):
+        if width < renditions["width"]:
+            names.append(rendition_name(name, width))
+        names.extend(
+            rendition_name(name, width, image_format)
+            for image_format in renditions["formats"]
+        )
+    return names
+
+
+def rendition_url(image_file, renditions, width, image_format=None):
+    # In its own format the original is served at its own width.
+    if image_format is None and width == renditions["width"]:
+        return image_file.url
+    return image_file.storage.url(
+        rendition_name(image_file.name, width, image_format)
+    )
+
+
+def srcset(image_file, renditions, image_format=None):
+    return ", ".join(
+        f"{rendition_url(image_file, renditions, width, image_format)} "
+        f"{width}w"
+        for width in renditions["widths"]
+    )
+
+
+def sources(image_file, renditions):
+    """``(type, srcset)`` of every modern format made for the image."""
+    return [
+        (MIME_TYPES[name], srcset(image_file, renditions, name))
+        for name in renditions["formats"]
+    ]
+
+
+def open_image(stream, largest_width):
+    """Open an upload upright, decoding no more pixels than needed.
+
+    Returns the image and the upright size of the original.
+    """
+    image = Image.open(stream)
+    size = image.size
+    if image.getexif().get(ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+        size = size[::-1]
+    # JPEG can decode straight at 1/2, 1/4 or 1/8 of the size; asking for
+    # a square keeps the largest copy sharp whatever the orientation.
+    image.draft(image.mode, (largest_width, largest_width))
+    return ImageOps.exif_transpose(image), size
+
+
+def dominant_color(image):
+    sample = image.convert("RGB")
+    sample.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+    clusters = sample.quantize(COLOR_CLUSTERS, Image.Quantize.MEDIANCUT)
+    _, index = max(clusters.getcolors())
+    red, green, blue = clusters.getpalette()[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def placeholder(image):
+    """A tiny blurred copy of the image as a ``data:`` URI."""
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.convert("RGB").resize(
+        (PLACEHOLDER_WIDTH, height), Image.Resampling.BOX
+    )
+    tiny = tiny.filter(ImageFilter.GaussianBlur(PLACEHOLDER_BLUR))
+    image_format = "WEBP" if "WEBP" in modern_formats() else "JPEG"
+    output = BytesIO()
+    tiny.save(output, image_format, quality=PLACEHOLDER_QUALITY)
+    data = b64encode(output.getvalue()).decode("ascii")
+    return f"data:image/{image_format.lower()};base64,{data}"
+
+
+def encode(image, image_format, icc_profile):
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    save_options = dict(SAVE_OPTIONS[image_format])
+    # EXIF and other metadata are dropped; the colour profile is kept.
+    if icc_profile:
+        save_options["icc_profile"] = icc_profile
+    output = BytesIO()
+    image.save(output, image_format, **save_options)
+    return output.getvalue()
+
+
+def iter_renditions(image, original_width, name, formats):
+    """Yield ``(width, format, data)`` of every copy of an opened image.
+
+    Copies in the upload's own format are made only below its width,
+    ``formats`` at every width offered.
+    """
+    icc_profile = image.info.get("icc_profile")
+    own_format = rendition_format(name)
+    for width in rendition_widths(original_width):
+        if width == image.width:
+            copy = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            copy = image.resize(
+                (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+        image_formats = list(formats)
+        if width < original_width and own_format not in image_formats:
+            image_formats.append(own_format)
+        for image_format in image_formats:
+            yield width, image_format, encode(copy, image_format, icc_profile)
+
+
+def make_renditions(image_file, formats=None):
+    """Write the copies of an uploaded image next to it.
+
+    Images are never scaled up. Returns what templates need to show the
+    image: the original's size, the widths and modern formats of the
+    copies, the dominant colour and a placeholder.
+    """
+    formats = modern_formats() if formats is None else list(formats)
+    storage, name = image_file.storage, image_file.name
+    with storage.open(name) as stream:
+        image, (width, height) = open_image(stream, RENDITION_WIDTHS[-1])
+        for copy_width, image_format, data in iter_renditions(
+            image, width, name, formats
+        ):
+            path = rendition_name(name, copy_width, image_format)
+            # Content-addressed storage would name a copy after its own
+            # bytes rather than after the original.
+            if hasattr(storage, "save_copy"):
+                storage.save_copy(path, ContentFile(data))
+            else:
+                storage.delete(path)
+                storage.save(path, ContentFile(data))
+        return {
+            "width": width,
+            "height": height,
+            "widths": rendition_widths(width),
+            "formats": formats,
+            "color": dominant_color(image),
+            "placeholder": placeholder(image),
+        }
@@ -0,0 +1,259 @@
+import json
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from blog.models import Comment, Post, User
+from blog.paginators import MAX_OFFSET_PAGE
+from blog.views import PAGINATE_BY, get_queryset_vis_pub
+
+DEFAULT_SIZES = "1000,100000,1000000"
+COMMENTS_PER_POST = 10
+POSTS_PER_USER = 100
+PERCENTILES = (50, 90, 99)
+# Every scenario starts from an empty cache; a private one, so that the
+# configured cache, possibly shared with production, is left alone.
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, queries, peak_bytes):
+    latencies = sorted(latencies)
+    summary = {
+        f"p{percent}_ms": round(percentile(latencies, percent) * 1000, 3)
+        for percent in PERCENTILES
+    }
+    summary.update(
+        max_ms=round(latencies[-1] * 1000, 3),
+        mean_ms=round(sum(latencies) / len(latencies) * 1000, 3),
+        requests=len(latencies),
+        queries=max(queries),
+        peak_memory_kib=round(peak_bytes / 1024, 1),
+    )
+    return summary
+
+
+def fixed(send, *args):
+    """Scenario whose every request is the same and needs no setup."""
+    return lambda: partial(send, *args)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет ленты, страницу публикации и работу с комментариями "
+        "через тестовый клиент на синтетических базах нескольких размеров "
+        "и сохраняет перцентили задержки, число запросов и пиковую память "
+        "в JSON. Работает на отдельной временной базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default=DEFAULT_SIZES,
+            help="Размеры базы в публикациях через запятую.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=30,
+            help="Сколько раз запрашивать каждую страницу.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="Куда записать результаты.",
+        )
+
+    def handle(self, *args, sizes, repeat, seed, output, **options):
+        try:
+            sizes = sorted(int(size) for size in sizes.split(","))
+        except ValueError:
+            raise CommandError("--sizes: ожидаются целые числа через запятую.")
+        results = {
+            "commit": current_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "repeat": repeat,
+            "sizes": {},
+        }
+        test_settings = connection.settings_dict["TEST"]
+        test_name = test_settings.get("NAME")
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES=BENCHMARK_CACHES
+        ):
+            test_settings["NAME"] = str(Path(directory) / "benchmark.sqlite3")
+            # With DEBUG on, the debug toolbar would dominate every timing.
+            setup_test_environment(debug=False)
+            try:
+                old_name = connection.creation.create_test_db(verbosity=0)
+                try:
+                    for size in sizes:
+                        self.grow(size, seed)
+                        results["sizes"][size] = self.measure(repeat)
+                finally:
+                    connection.creation.destroy_test_db(
+                        old_name, verbosity=0
+                    )
+            finally:
+                teardown_test_environment()
+                test_settings["NAME"] = test_name
+        Path(output).write_text(json.dumps(results, indent=2))
+        self.stdout.write(
+            self.style.SUCCESS(f"Результаты записаны в {output}.")
+        )
+
+    def grow(self, size, seed):
+        """Top the database up to ``size`` posts with generated data."""
+        posts = Post.objects.count()
+        if posts >= size:
+            return
+        added = size - posts
+        self.stdout.write(f"Генерация базы на {size} публикаций...")
+        call_command(
+            "generate_dataset",
+            posts=added,
+            comments=added * COMMENTS_PER_POST,
+            users=max(1, added // POSTS_PER_USER),
+            categories=0 if posts else 20,
+            locations=0 if posts else 200,
+            seed=seed + size,
+            stdout=self.stdout,
+        )
+
+    def measure(self, repeat):
+        """Time every scenario against the current database."""
+        post = (
+            Post.objects.filter(is_visible=True)
+            .order_by("-comment_count")
+            .select_related("author", "category")
+            .first()
+        )
+        if post is None:
+            raise CommandError("В базе нет видимых публикаций.")
+        reader = User.objects.create_user(f"benchmark{time.time_ns()}")
+        client = Client()
+        client.force_login(reader)
+        results = {}
+        for name, scenario in self.scenarios(post, reader, client):
+            results[name] = self.run(scenario, repeat)
+            self.stdout.write(f"  {name}: {results[name]}")
+        return {
+            "posts": Post.objects.count(),
+            "comments": Comment.objects.count(),
+            "views": results,
+        }
+
+    def scenarios(self, post, reader, client):
+        """Yield ``(name, prepare)`` pairs.
+
+        ``prepare()`` sets up one request outside the timed section and
+        returns a callable that sends it.
+        """
+        anonymous = Client()
+        # The deepest page still served by offset rather than by cursor.
+        deep_page = min(
+            MAX_OFFSET_PAGE,
+            max(1, get_queryset_vis_pub().count() // PAGINATE_BY),
+        )
+        pages = {
+            "index": reverse("blog:index"),
+            "index_deep": f"{reverse('blog:index')}?page={deep_page}",
+            "category_posts": reverse(
+                "blog:category_posts", args=[post.category.slug]
+            ),
+            "profile_detail": reverse(
+                "blog:profile", args=[post.author.username]
+            ),
+            "post_detail": reverse("blog:post_detail", args=[post.pk]),
+        }
+        for name, url in pages.items():
+            yield name, fixed(client.get, url)
+        yield "index_anonymous", fixed(anonymous.get, pages["index"])
+
+        def comment():
+            return Comment.objects.create(
+                post=post, author=reader, text="Комментарий для замера."
+            )
+
+        yield "comment_create", fixed(
+            client.post,
+            reverse("blog:add_comment", args=[post.pk]),
+            {"text": "Новый комментарий."},
+        )
+        edit_url = reverse("blog:edit_comment", args=[post.pk, comment().pk])
+        yield "comment_edit", lambda: partial(
+            client.post, edit_url, {"text": f"Правка {time.perf_counter()}."}
+        )
+        yield "comment_delete", lambda: partial(
+            client.post,
+            reverse("blog:delete_comment", args=[post.pk, comment().pk]),
+        )
+
+    def run(self, prepare, repeat):
+        """Time ``repeat`` requests, then one more under tracemalloc."""
+        cache.clear()
+        latencies, queries = [], []
+        for _ in range(repeat):
+            request = prepare()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"Ответ {response.status_code} на {response.request}."
+                )
+            queries.append(len(captured))
+        request = prepare()
+        tracemalloc.start()
+        try:
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return summarize(latencies, queries, peak)
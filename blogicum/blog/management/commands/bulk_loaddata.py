@@ -0,0 +1,222 @@
+import json
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from blog.cache import invalidate_all_feeds
+from blog.models import Post
+from blog.storage import recount_references
+
+READ_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+LOAD_ORDER = (
+    settings.AUTH_USER_MODEL.lower(),
+    "blog.category",
+    "blog.location",
+    "blog.post",
+    "blog.comment",
+)
+
+
+class JSONArrayReader:
+    """Buffer holding the unread tail of a JSON file plus one more read."""
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = ""
+        self.position = 0
+
+    def read_more(self):
+        chunk = self.stream.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def next_char(self):
+        """Skip whitespace and return the next significant character."""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                raise CommandError("Файл оборвался посреди JSON-массива.")
+
+    def decode(self, decoder):
+        while True:
+            try:
+                item, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                if not self.read_more():
+                    raise CommandError(f"Ошибка в JSON: {error}.")
+                continue
+            # A number or a literal may continue in the next read.
+            if end == len(self.buffer) and self.read_more():
+                continue
+            self.position = end
+            return item
+
+    def expect(self, chars):
+        char = self.next_char()
+        if char not in chars:
+            raise CommandError(f"Неожиданный символ {char!r} в JSON.")
+        self.position += 1
+        return char
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """Yield the items of a top-level JSON array without reading it whole."""
+    reader = JSONArrayReader(stream, read_size)
+    decoder = json.JSONDecoder()
+    reader.expect("[")
+    if reader.next_char() == "]":
+        return
+    while True:
+        reader.next_char()
+        yield reader.decode(decoder)
+        if reader.expect(",]") == "]":
+            return
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает фикстуру в формате db.json потоково: читает JSON-массив "
+        "по одному объекту и вставляет пользователей, категории, "
+        "местоположения, публикации и комментарии пачками. Записи других "
+        "моделей пропускаются — для них есть loaddata."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("fixture", help="Путь к JSON-файлу.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Сколько записей одной модели вставлять за один запрос.",
+        )
+
+    def handle(self, *args, fixture, batch_size, **options):
+        self.batch_size = batch_size
+        self.pending = defaultdict(list)
+        self.loaded = Counter()
+        self.skipped = Counter()
+        self.models = {}
+        started = time.perf_counter()
+        with open(fixture, encoding="utf-8") as stream:
+            with connection.constraint_checks_disabled():
+                self.load(iter_json_array(stream))
+        connection.check_constraints(
+            table_names=[
+                model._meta.db_table for model in self.models.values()
+            ]
+        )
+        self.reset_sequences()
+        self.report(time.perf_counter() - started)
+        self.rebuild_derived_data()
+
+    def load(self, items):
+        objects = serializers.deserialize(
+            "python", items, ignorenonexistent=True
+        )
+        for deserialized in objects:
+            label = deserialized.object._meta.label_lower
+            if label not in LOAD_ORDER:
+                self.skipped[label] += 1
+                continue
+            self.models[label] = type(deserialized.object)
+            self.pending[label].append(deserialized)
+            if len(self.pending[label]) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        """Insert everything pending, parents first, in one transaction.
+
+        Rows go through the same raw insert ``bulk_create`` uses, but with
+        ``raw=True`` as in ``loaddata``, so ``auto_now_add`` timestamps
+        from the fixture are kept instead of being stamped with now.
+        """
+        with transaction.atomic():
+            for label in LOAD_ORDER:
+                batch = self.pending.pop(label, None)
+                if not batch:
+                    continue
+                try:
+                    self.insert(self.models[label], batch)
+                except IntegrityError as error:
+                    raise CommandError(
+                        f"Не удалось вставить записи {label}: {error}."
+                    )
+                self.loaded[label] += len(batch)
+
+    def insert(self, model, batch):
+        now = timezone.now()
+        fields = model._meta.local_concrete_fields
+        stamped = [
+            field
+            for field in fields
+            if getattr(field, "auto_now", False)
+            or getattr(field, "auto_now_add", False)
+        ]
+        for deserialized in batch:
+            for field in stamped:
+                if getattr(deserialized.object, field.attname) is None:
+                    setattr(deserialized.object, field.attname, now)
+        model._base_manager._insert(
+            [deserialized.object for deserialized in batch],
+            fields=fields,
+            raw=True,
+        )
+        for deserialized in batch:
+            for name, values in (deserialized.m2m_data or {}).items():
+                if values:
+                    getattr(deserialized.object, name).set(values)
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            self.style, list(self.models.values())
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def rebuild_derived_data(self):
+        """Recompute what the post and comment signals maintain."""
+        call_command("rebuild_comment_counts", stdout=self.stdout)
+        posts = Post.objects.all()
+        posts.update(is_visible=False)
+        posts.filter(is_published=True, category__is_published=True).update(
+            is_visible=True
+        )
+        posts.exclude(image="").exclude(image__isnull=True).filter(
+            image_renditions={}
+        ).update(image_renditions=None)
+        call_command("rebuild_search_index", stdout=self.stdout)
+        recount_references()
+        invalidate_all_feeds()
+
+    def report(self, elapsed):
+        for label in LOAD_ORDER:
+            if self.loaded[label]:
+                self.stdout.write(f"{label}: {self.loaded[label]}")
+        for label, count in sorted(self.skipped.items()):
+            self.stdout.write(f"{label}: пропущено {count}")
+        total = sum(self.loaded.values())
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Загружено записей: {total} за {elapsed:.2f} с "
+                f"({rate:.0f} записей/с)."
+            )
+        )
@@ -0,0 +1,248 @@
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blog.cache import invalidate_all_feeds
+from blog.models import Category, Comment, Location, Post
+
+User = get_user_model()
+
+WORDS = (
+    "утро день вечер ночь город река море лес дорога поезд вокзал дом "
+    "окно письмо книга друг сосед обед ужин чай кофе дождь снег солнце "
+    "ветер прогулка встреча разговор история праздник работа отпуск "
+    "поездка музей театр концерт рынок площадь мост сад парк старый новый "
+    "тихий шумный долгий короткий весёлый грустный тёплый холодный "
+    "неожиданно снова вдруг сегодня вчера завтра наконец опять"
+).split()
+# Publication dates are offsets from an epoch. By default it is the start
+# of the current UTC day: a seed gives the same rows all day, and scheduled
+# posts are still ahead of the clock.
+# Mean age of a post in days; most posts are recent, a few are years old.
+MEAN_POST_AGE_DAYS = 120
+MAX_SCHEDULE_DAYS = 30
+# Pareto shape of post popularity; lower means a longer tail.
+POPULARITY_SHAPE = 1.5
+# Texts are drawn from a pool: building each one from words costs more
+# than inserting the row.
+TEXT_POOL_SIZE = 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, категориями, "
+        "местоположениями, публикациями и комментариями для нагрузочных "
+        "тестов. При одном и том же --seed данные совпадают."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in (
+            ("users", 1000),
+            ("categories", 20),
+            ("locations", 200),
+            ("posts", 10000),
+            ("comments", 100000),
+        ):
+            parser.add_argument(
+                f"--{name}",
+                type=int,
+                default=default,
+                help=f"Сколько записей создать (по умолчанию {default}).",
+            )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--unpublished",
+            type=float,
+            default=0.05,
+            help="Доля снятых с публикации постов и категорий.",
+        )
+        parser.add_argument(
+            "--scheduled",
+            type=float,
+            default=0.02,
+            help="Доля отложенных публикаций с датой позже --epoch.",
+        )
+        parser.add_argument(
+            "--epoch",
+            help=(
+                "Момент, вокруг которого распределяются даты публикаций, "
+                "в ISO 8601; по умолчанию начало текущих суток по UTC. "
+                "С одним и тем же --epoch и --seed данные совпадают "
+                "в любой день."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["posts"] and not (
+            (options["users"] or User.objects.exists())
+            and (options["categories"] or Category.objects.exists())
+        ):
+            raise CommandError(
+                "Для публикаций нужны пользователи и категории: задайте "
+                "--users и --categories или заполните их заранее."
+            )
+        if options["epoch"] is None:
+            epoch = timezone.now().replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+        else:
+            epoch = parse_datetime(options["epoch"])
+            if epoch is None:
+                raise CommandError(
+                    f"--epoch: не дата и время: {options['epoch']}"
+                )
+            if timezone.is_naive(epoch):
+                epoch = timezone.make_aware(epoch)
+        self.rng = random.Random(options["seed"])
+        self.epoch = epoch
+        self.batch_size = options["batch_size"]
+        self.unpublished = options["unpublished"]
+        self.scheduled = options["scheduled"]
+        self.titles = self.pool(2, 6)
+        self.texts = [text + "." for text in self.pool(20, 120)]
+        self.comment_texts = self.pool(3, 30)
+        self.categories = []
+        started = time.perf_counter()
+
+        users = self.create(User, options["users"], self.make_user)
+        self.create(Category, options["categories"], self.make_category)
+        locations = self.create(
+            Location, options["locations"], self.make_location
+        )
+        # When topping up a database, new posts go to existing rows.
+        self.users = users or list(User.objects.values_list("pk", flat=True))
+        self.categories = self.categories or list(
+            Category.objects.values_list("pk", "is_published")
+        )
+        self.locations = locations or list(
+            Location.objects.values_list("pk", flat=True)
+        )
+        self.published_categories = {
+            pk for pk, published in self.categories if published
+        }
+        n_comments = options["comments"] if options["posts"] else 0
+        self.comment_counts = self.spread(n_comments, options["posts"])
+        posts = self.create(Post, options["posts"], self.make_post)
+        self.commented_posts = (
+            post
+            for post, count in zip(posts, self.comment_counts)
+            for _ in range(count)
+        )
+        self.create(Comment, n_comments, self.make_comment)
+
+        call_command("rebuild_search_index", stdout=self.stdout)
+        invalidate_all_feeds()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово за {time.perf_counter() - started:.1f} с."
+            )
+        )
+
+    def create(self, model, count, make):
+        """Insert ``count`` rows built by ``make(index, pk)``.
+
+        Primary keys are assigned here so that later models can refer to
+        them without reading anything back; the range of them is returned.
+        """
+        first = (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        pks = range(first, first + count)
+        started = time.perf_counter()
+        for start in range(0, count, self.batch_size):
+            batch = [
+                make(index, pks[index])
+                for index in range(start, min(start + self.batch_size, count))
+            ]
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(
+            f"{model._meta.label_lower}: {count} ({rate:.0f} записей/с)"
+        )
+        return pks
+
+    def spread(self, total, buckets):
+        """Split ``total`` comments over posts with a long-tailed skew."""
+        if not buckets:
+            return []
+        weights = [
+            self.rng.paretovariate(POPULARITY_SHAPE) for _ in range(buckets)
+        ]
+        scale = total / sum(weights)
+        counts = [math.floor(weight * scale) for weight in weights]
+        for index in self.rng.sample(range(buckets), total - sum(counts)):
+            counts[index] += 1
+        return counts
+
+    def words(self, low, high):
+        count = self.rng.randint(low, high)
+        return " ".join(self.rng.choices(WORDS, k=count)).capitalize()
+
+    def pool(self, low, high):
+        return [self.words(low, high) for _ in range(TEXT_POOL_SIZE)]
+
+    def make_user(self, index, pk):
+        return User(
+            pk=pk,
+            username=f"user{pk}",
+            first_name=self.words(1, 1),
+            password="!",
+        )
+
+    def make_category(self, index, pk):
+        is_published = self.rng.random() >= self.unpublished
+        self.categories.append((pk, is_published))
+        return Category(
+            pk=pk,
+            title=self.words(1, 3),
+            description=self.words(5, 15),
+            slug=f"category-{pk}",
+            is_published=is_published,
+        )
+
+    def make_location(self, index, pk):
+        return Location(pk=pk, name=self.words(1, 2))
+
+    def make_post(self, index, pk):
+        if self.rng.random() < self.scheduled:
+            offset = timedelta(days=self.rng.uniform(0, MAX_SCHEDULE_DAYS))
+        else:
+            offset = -timedelta(
+                days=self.rng.expovariate(1 / MEAN_POST_AGE_DAYS)
+            )
+        category, _ = self.rng.choice(self.categories)
+        is_published = self.rng.random() >= self.unpublished
+        return Post(
+            pk=pk,
+            title=self.rng.choice(self.titles),
+            text=self.rng.choice(self.texts),
+            pub_date=self.epoch + offset,
+            author_id=self.rng.choice(self.users),
+            category_id=category,
+            location_id=(
+                self.rng.choice(self.locations) if self.locations else None
+            ),
+            is_published=is_published,
+            is_visible=(
+                is_published and category in self.published_categories
+            ),
+            comment_count=self.comment_counts[index],
+        )
+
+    def make_comment(self, index, pk):
+        return Comment(
+            pk=pk,
+            text=self.rng.choice(self.comment_texts),
+            post_id=next(self.commented_posts),
+            author_id=self.rng.choice(self.users),
+        )
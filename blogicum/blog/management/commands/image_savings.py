@@ -0,0 +1,144 @@
+import json
+import random
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from blog.images import (
+    FORMATS,
+    IMAGE_ERRORS,
+    RENDITION_WIDTHS,
+    iter_renditions,
+    modern_formats,
+    open_image,
+    rendition_format,
+)
+
+# Copies made by the image worker, which are not part of the corpus.
+RENDITION_RE = re.compile(r"\.\d+w\.\w+$")
+CORPUS_FORMATS = ("JPEG", "PNG")
+OWN_FORMAT = "own"
+
+
+class Command(BaseCommand):
+    help = (
+        "Оценивает, сколько байт экономят WebP и AVIF: перекодирует "
+        "выборку картинок JPEG и PNG во все ширины srcset в памяти и "
+        "сравнивает размер с копиями в исходном формате и с оригиналами. "
+        "Файлы не записываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="Каталог с картинками; по умолчанию MEDIA_ROOT/posts_images.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=200,
+            help="Сколько случайных картинок взять.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Куда записать JSON с итогами.")
+
+    def handle(self, *args, path, limit, seed, output, **options):
+        directory = Path(path or Path(settings.MEDIA_ROOT) / "posts_images")
+        corpus = sorted(
+            file
+            for file in directory.rglob("*")
+            if FORMATS.get(file.suffix.lower()) in CORPUS_FORMATS
+            and not RENDITION_RE.search(file.name)
+        )
+        if not corpus:
+            raise CommandError(f"В {directory} нет картинок.")
+        corpus = random.Random(seed).sample(corpus, min(limit, len(corpus)))
+        formats = modern_formats()
+        sizes, seconds = Counter(), Counter()
+        originals = measured = 0
+        for file in corpus:
+            try:
+                original, file_sizes, file_seconds = self.measure(
+                    file, formats
+                )
+            except IMAGE_ERRORS as error:
+                self.stderr.write(f"{file.name}: {error}")
+                continue
+            measured += 1
+            originals += original
+            sizes.update(file_sizes)
+            seconds.update(file_seconds)
+        if not measured:
+            raise CommandError(
+                f"Ни одну из {len(corpus)} картинок не удалось открыть."
+            )
+        results = {
+            "images": measured,
+            "originals_bytes": originals,
+            "formats": {
+                image_format: {
+                    "bytes": sizes[image_format],
+                    "saved_vs_own_format": round(
+                        1 - sizes[image_format] / sizes[OWN_FORMAT], 3
+                    ),
+                    "saved_vs_originals": round(
+                        1 - sizes[image_format] / originals, 3
+                    ),
+                    "encode_seconds": round(seconds[image_format], 3),
+                }
+                for image_format in [OWN_FORMAT, *formats]
+            },
+        }
+        self.report(results)
+        if output:
+            Path(output).write_text(json.dumps(results, indent=2))
+
+    def measure(self, file, formats):
+        """Return the size of ``file`` and the bytes and seconds its copies
+        take, by format.
+
+        Copies in the upload's own format stand for what a browser gets
+        without WebP or AVIF; at the original's width that is the
+        original file itself.
+        """
+        sizes, seconds = Counter(), Counter()
+        original = file.stat().st_size
+        with open(file, "rb") as stream:
+            image, (original_width, _) = open_image(
+                stream, RENDITION_WIDTHS[-1]
+            )
+            own_format = rendition_format(file.name)
+            if original_width <= RENDITION_WIDTHS[-1]:
+                sizes[OWN_FORMAT] += original
+            # Resizing is counted towards the first format at each width.
+            started = time.perf_counter()
+            for _, image_format, data in iter_renditions(
+                image, original_width, file.name, formats
+            ):
+                finished = time.perf_counter()
+                if image_format == own_format:
+                    image_format = OWN_FORMAT
+                sizes[image_format] += len(data)
+                seconds[image_format] += finished - started
+                started = finished
+        return original, sizes, seconds
+
+    def report(self, results):
+        originals = results["originals_bytes"]
+        self.stdout.write(
+            f"Картинок: {results['images']}, оригиналы: {originals} байт."
+        )
+        for image_format, result in results["formats"].items():
+            if image_format == OWN_FORMAT:
+                image_format = "исходный формат"
+            self.stdout.write(
+                f"{image_format}: {result['bytes']} байт, "
+                f"экономия {result['saved_vs_own_format']:.1%} "
+                "к копиям в исходном формате, "
+                f"{result['saved_vs_originals']:.1%} к оригиналам, "
+                f"кодирование {result['encode_seconds']:.2f} с"
+            )
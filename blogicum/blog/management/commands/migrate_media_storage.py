@@ -0,0 +1,86 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from blog.cache import bump_version, invalidate_all_feeds
+from blog.images import rendition_names
+from blog.models import Post
+from blog.storage import is_content_name, recount_references
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит картинки публикаций в хранилище по хешу содержимого: "
+        "каждый файл и его уменьшенные копии получают имя по SHA-256 в "
+        "подкаталогах, одинаковые файлы остаются в одном экземпляре. "
+        "Публикации обходятся пачками по возрастанию id, поэтому команду "
+        "можно прервать и запустить снова. В конце пересчитывает, "
+        "сколько публикаций использует каждый файл."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Сколько публикаций переносить в одной транзакции.",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        if not hasattr(default_storage, "adopt"):
+            raise CommandError(
+                "DEFAULT_FILE_STORAGE должно быть "
+                "blog.storage.ContentAddressedStorage."
+            )
+        last_id, moved = 0, 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_id)
+                .exclude(image="")
+                .exclude(image__isnull=True)
+                .order_by("pk")
+                .values_list("pk", "image", "image_renditions")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            moved += self.migrate(batch)
+        recount_references()
+        invalidate_all_feeds()
+        self.stdout.write(
+            self.style.SUCCESS(f"Перенесено картинок публикаций: {moved}.")
+        )
+
+    def migrate(self, batch):
+        """Link the batch's files to their new names, point the posts at
+        them and only then delete the old files, so an interrupted run
+        leaves every post with a file."""
+        new_names, old_files, moved = {}, set(), 0
+        with transaction.atomic():
+            for pk, name, renditions in batch:
+                if is_content_name(name):
+                    continue
+                if name not in new_names:
+                    if not default_storage.exists(name):
+                        self.stderr.write(f"{name}: файла нет")
+                        continue
+                    copies = rendition_names(name, renditions or {})
+                    new_names[name] = default_storage.adopt(name, copies)
+                    old_files.update([name, *copies])
+                Post.objects.filter(pk=pk, image=name).update(
+                    image=new_names[name], updated_at=timezone.now()
+                )
+                bump_version("post", pk)
+                moved += 1
+        # Later posts may still use an old file and its copies.
+        for name, renditions in Post.objects.filter(
+            image__in=new_names
+        ).values_list("image", "image_renditions"):
+            old_files.discard(name)
+            old_files.difference_update(
+                rendition_names(name, renditions or {})
+            )
+        for name in old_files:
+            default_storage.delete(name)
+        return moved
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.cache import bump_version, invalidate_feeds, saved_post_feeds
+from blog.images import IMAGE_ERRORS, make_renditions
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Фоновый обработчик картинок: делает уменьшенные копии картинок "
+        "публикаций, поставленных в очередь при загрузке, и их версии в "
+        "WebP и AVIF, если Pillow умеет их сохранять. Без --once "
+        "работает постоянно и проверяет очередь раз в --interval секунд. "
+        "Запускайте один обработчик на базу."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать очередь и завершиться.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Пауза между проверками пустой очереди, в секундах.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Сколько публикаций брать из очереди за раз.",
+        )
+
+    def handle(self, *args, once, interval, batch_size, **options):
+        while True:
+            batch = list(
+                Post.objects.filter(image_renditions__isnull=True)
+                .order_by("pk")
+                .only("pk", "image")[:batch_size]
+            )
+            for post in batch:
+                self.process(post)
+            if len(batch) < batch_size:
+                if once:
+                    return
+                time.sleep(interval)
+
+    def process(self, post):
+        started = time.perf_counter()
+        try:
+            renditions = make_renditions(post.image)
+        except IMAGE_ERRORS as error:
+            # A broken upload stays as it is instead of blocking the queue.
+            self.stderr.write(f"{post.image.name}: {error}")
+            renditions = {}
+        # The author may have uploaded another image in the meantime.
+        updated = Post.objects.filter(
+            pk=post.pk, image=post.image.name, image_renditions__isnull=True
+        ).update(image_renditions=renditions, updated_at=timezone.now())
+        if updated:
+            bump_version("post", post.pk)
+            invalidate_feeds(saved_post_feeds(post.pk))
+        self.stdout.write(
+            f"{post.image.name}: {renditions or 'без копий'} "
+            f"за {time.perf_counter() - started:.2f} с"
+        )
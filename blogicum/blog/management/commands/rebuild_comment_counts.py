@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики комментариев у публикаций."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Сколько публикаций обновлять в одной транзакции.",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        counts = (
+            Comment.objects.filter(post=OuterRef("pk"))
+            .order_by()
+            .values("post")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        last_id = Post.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        updated = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    id__gt=start, id__lte=start + batch_size
+                ).update(comment_count=Coalesce(Subquery(counts), 0))
+        self.stdout.write(
+            self.style.SUCCESS(f"Обновлено публикаций: {updated}.")
+        )
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+from blog.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Перестраивает полнотекстовый индекс публикаций и триграммный "
+        "индекс подсказок по заголовкам и именам пользователей."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько публикаций добавлять в индекс за один запрос.",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        with transaction.atomic():
+            posts, users = rebuild_search_index(
+                Post.objects.all(), get_user_model().objects.all(), batch_size
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проиндексировано публикаций: {posts}, "
+                f"пользователей: {users}."
+            )
+        )
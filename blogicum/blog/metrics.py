@@ -0,0 +1,353 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNRESOLVED_VIEW = "unresolved"
+# Clients may send any method; the rest share one label value so they
+# cannot grow the series without bound.
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE")
+)
+OTHER_METHOD = "other"
+# How often, at most, a process writes its metrics for the others to read.
+FLUSH_INTERVAL = 1.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = {
+    "blogicum_requests_total": (
+        "counter",
+        "Обработанные запросы.",
+        None,
+    ),
+    "blogicum_request_duration_seconds": (
+        "histogram",
+        "Время обработки запроса.",
+        LATENCY_BUCKETS,
+    ),
+    "blogicum_db_queries": (
+        "histogram",
+        "Число запросов к базе на один запрос к сайту.",
+        QUERY_BUCKETS,
+    ),
+    "blogicum_db_query_duration_seconds_total": (
+        "counter",
+        "Суммарное время запросов к базе.",
+        None,
+    ),
+    "blogicum_template_render_seconds": (
+        "histogram",
+        "Время отрисовки шаблонов за один запрос.",
+        LATENCY_BUCKETS,
+    ),
+}
+
+
+class Shard:
+    """Metrics of a single thread.
+
+    Only the owning thread writes to its shard, so recording takes no
+    lock; readers copy the shards and sum them up.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        self.counters[name, labels] += amount
+
+    def observe(self, name, labels, value):
+        """Count ``value`` in its bucket; the last two slots of a
+        histogram hold the ``+Inf`` bucket and the sum."""
+        buckets = METRICS[name][2]
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = [0] * (len(buckets) + 1) + [0.0]
+            self.histograms[name, labels] = histogram
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+
+_shards = []
+_local = threading.local()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        _local.shard = Shard()
+        # list.append is atomic, so threads register without a lock.
+        _shards.append(_local.shard)
+        return _local.shard
+
+
+def snapshot():
+    """Sum the shards of every thread of this process."""
+    counters = defaultdict(float)
+    histograms = {}
+    for thread_shard in list(_shards):
+        for key, value in list(thread_shard.counters.items()):
+            counters[key] += value
+        merge_histograms(histograms, list(thread_shard.histograms.items()))
+    return counters, histograms
+
+
+def merge_histograms(into, items):
+    for key, histogram in items:
+        total = into.get(key)
+        if total is None:
+            into[key] = list(histogram)
+        else:
+            for index, value in enumerate(histogram):
+                total[index] += value
+
+
+def dump_snapshot(path):
+    """Atomically write this process's metrics to ``path``."""
+    counters, histograms = snapshot()
+    data = {
+        "counters": [
+            [name, labels, value] for (name, labels), value in counters.items()
+        ],
+        "histograms": [
+            [name, labels, histogram]
+            for (name, labels), histogram in histograms.items()
+        ],
+    }
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "w") as stream:
+        json.dump(data, stream)
+    os.replace(temporary, path)
+
+
+def load_snapshot(path, counters, histograms):
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return
+    for name, labels, value in data["counters"]:
+        counters[name, tuple(map(tuple, labels))] += value
+    merge_histograms(
+        histograms,
+        (
+            ((name, tuple(map(tuple, labels))), histogram)
+            for name, labels, histogram in data["histograms"]
+        ),
+    )
+
+
+def multiprocess_dir():
+    directory = getattr(settings, "METRICS_MULTIPROCESS_DIR", None)
+    return Path(directory) if directory else None
+
+
+def process_file(directory):
+    return directory / f"{os.getpid()}.json"
+
+
+def flush(force=False):
+    """Share this process's metrics in multi-process mode.
+
+    Runs at most once per ``FLUSH_INTERVAL``, and never makes a request
+    wait for another thread that is already writing.
+    """
+    global _last_flush
+    directory = multiprocess_dir()
+    if directory is None:
+        return
+    if not force and time.monotonic() - _last_flush < FLUSH_INTERVAL:
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        dump_snapshot(process_file(directory))
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """Return the counters and histograms to expose.
+
+    With ``METRICS_MULTIPROCESS_DIR`` set, every prefork worker leaves its
+    own file there and the metrics of all of them are summed. Files of
+    finished workers are kept so that counters never go back; the
+    directory should be emptied when the server starts.
+    """
+    directory = multiprocess_dir()
+    if directory is None:
+        return snapshot()
+    flush(force=True)
+    counters, histograms = defaultdict(float), {}
+    for path in sorted(directory.glob("*.json")):
+        load_snapshot(path, counters, histograms)
+    return counters, histograms
+
+
+def format_labels(labels, *extra):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for key, value in pairs
+    )
+
+
+def format_number(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def exposition():
+    """Render the metrics in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(
+                        f"{name}{format_labels(labels)} "
+                        f"{format_number(value)}"
+                    )
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            bounds = [*map(format_number, buckets), "+Inf"]
+            for bound, count in zip(bounds, histogram):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{format_labels(labels, ('le', bound))} "
+                    f"{cumulative}"
+                )
+            lines += [
+                f"{name}_sum{format_labels(labels)} "
+                f"{format_number(histogram[-1])}",
+                f"{name}_count{format_labels(labels)} {cumulative}",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimer:
+    """Database and template time spent on the current request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timer = getattr(_local, "timer", None)
+        if timer is None:
+            return super().render(context, request)
+        timer.rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.rendering -= 1
+            # A template rendered by another one is already being timed.
+            if not timer.rendering:
+                timer.template_seconds += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock backend, timing renders for ``MetricsMiddleware``."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class MetricsMiddleware:
+    """Record latency, database and template time per view.
+
+    Metrics are labelled with the view name from ``resolver_match``, such
+    as ``blog:index``. Template time is only known when ``TEMPLATES``
+    uses ``blog.metrics.DjangoTemplates``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _local.timer = RequestTimer()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+        finally:
+            _local.timer = None
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED_VIEW
+        labels = (("view", view),)
+        method = (
+            request.method if request.method in HTTP_METHODS else OTHER_METHOD
+        )
+        metrics = shard()
+        metrics.inc(
+            "blogicum_requests_total",
+            labels + (("method", method), ("status", response.status_code)),
+        )
+        metrics.observe(
+            "blogicum_request_duration_seconds",
+            labels + (("method", method),),
+            elapsed,
+        )
+        metrics.observe("blogicum_db_queries", labels, timer.queries)
+        metrics.inc(
+            "blogicum_db_query_duration_seconds_total",
+            labels,
+            timer.query_seconds,
+        )
+        metrics.observe(
+            "blogicum_template_render_seconds", labels, timer.template_seconds
+        )
+        flush()
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+def fill_is_visible(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Post.objects.filter(
+        is_published=True, category__is_published=True
+    ).update(is_visible=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0017_post_comment_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="post",
+            name="post_published_pub_date_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="post",
+            name="post_category_pub_date_idx",
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="is_visible",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="Публикация и её категория опубликованы.",
+                verbose_name="Видна в лентах",
+            ),
+        ),
+        migrations.RunPython(fill_is_visible, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_visible", True)),
+                fields=["-pub_date", "-id"],
+                name="post_visible_pub_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_visible", True)),
+                fields=["category", "-pub_date", "-id"],
+                name="post_visible_category_idx",
+            ),
+        ),
+    ]
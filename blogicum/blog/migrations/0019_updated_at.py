@@ -0,0 +1,43 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0018_post_is_visible"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Изменено",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Изменено",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Изменено",
+            ),
+            preserve_default=False,
+        ),
+    ]
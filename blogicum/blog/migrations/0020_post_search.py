@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0019_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE blog_post_fts USING fts5("
+            "title, text, tokenize = 'unicode61 remove_diacritics 2')",
+            "DROP TABLE blog_post_fts",
+        ),
+        migrations.RunSQL(
+            "INSERT INTO blog_post_fts (rowid, title, text) "
+            "SELECT id, "
+            "replace(replace(title, 'ё', 'е'), 'Ё', 'Е'), "
+            "replace(replace(text, 'ё', 'е'), 'Ё', 'Е') "
+            "FROM blog_post",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("blog", "0020_post_search"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE blog_post_title_trgm USING fts5("
+            "title, tokenize = 'trigram')",
+            "DROP TABLE blog_post_title_trgm",
+        ),
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE blog_username_trgm USING fts5("
+            "username, tokenize = 'trigram')",
+            "DROP TABLE blog_username_trgm",
+        ),
+        migrations.RunSQL(
+            "INSERT INTO blog_post_title_trgm (rowid, title) "
+            "SELECT id, replace(replace(title, 'ё', 'е'), 'Ё', 'Е') "
+            "FROM blog_post",
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            "INSERT INTO blog_username_trgm (rowid, username) "
+            "SELECT id, replace(replace(username, 'ё', 'е'), 'Ё', 'Е') "
+            "FROM auth_user",
+            migrations.RunSQL.noop,
+        ),
+    ]
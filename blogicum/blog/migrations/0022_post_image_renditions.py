@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Post.objects.exclude(image="").exclude(image__isnull=True).update(
+        image_renditions=None
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0021_suggest_trigrams"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_renditions",
+            field=models.JSONField(
+                default=list,
+                editable=False,
+                help_text=(
+                    "Ширины готовых копий в пикселях; пусто, пока копии "
+                    "ждут обработчика картинок."
+                ),
+                null=True,
+                verbose_name="Уменьшенные копии картинки",
+            ),
+        ),
+        migrations.RunPython(
+            queue_existing_images, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("image_renditions__isnull", True)),
+                fields=["id"],
+                name="post_image_pending_idx",
+            ),
+        ),
+    ]
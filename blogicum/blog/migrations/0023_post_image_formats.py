@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+def requeue_images(apps, schema_editor):
+    """Queue every image again: copies made so far have no WebP or AVIF
+    versions and are described in the old format."""
+    Post = apps.get_model("blog", "Post")
+    with_image = Post.objects.exclude(image="").exclude(image__isnull=True)
+    with_image.update(image_renditions=None)
+    Post.objects.exclude(pk__in=with_image.values("pk")).update(
+        image_renditions={}
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0022_post_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="image_renditions",
+            field=models.JSONField(
+                default=dict,
+                editable=False,
+                help_text=(
+                    "Ширина оригинала, ширины и форматы готовых копий; "
+                    "пусто, пока копии ждут обработчика картинок."
+                ),
+                null=True,
+                verbose_name="Копии картинки",
+            ),
+        ),
+        migrations.RunPython(requeue_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+def requeue_images(apps, schema_editor):
+    """Queue processed images again to get their size, colour and
+    placeholder."""
+    Post = apps.get_model("blog", "Post")
+    Post.objects.exclude(image="").exclude(image__isnull=True).exclude(
+        image_renditions__isnull=True
+    ).update(image_renditions=None)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0023_post_image_formats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="image_renditions",
+            field=models.JSONField(
+                default=dict,
+                editable=False,
+                help_text=(
+                    "Размер оригинала, ширины и форматы готовых копий, "
+                    "основной цвет и размытая миниатюра; пусто, пока "
+                    "картинка ждёт обработчика картинок."
+                ),
+                null=True,
+                verbose_name="Копии картинки",
+            ),
+        ),
+        migrations.RunPython(requeue_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    """Count the posts using each image stored so far."""
+    MediaFile = apps.get_model("blog", "MediaFile")
+    Post = apps.get_model("blog", "Post")
+    counts = (
+        Post.objects.exclude(image="")
+        .exclude(image__isnull=True)
+        .order_by()
+        .values_list("image")
+        .annotate(references=Count("pk"))
+    )
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=name, references=references)
+            for name, references in counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0024_post_image_placeholder"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                (
+                    "references",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Сколько публикаций используют файл.",
+                        verbose_name="Ссылок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "файл",
+                "verbose_name_plural": "Файлы",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["image"], name="post_image_idx"),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:57
+
+import blog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0025_media_files"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="post",
+            field=models.ForeignKey(
+                on_delete=blog.models.cascade_with_post,
+                related_name="comments",
+                to="blog.post",
+            ),
+        ),
+    ]
@@ -14,6 +14,7 @@ class PublishedModel(models.Model):
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name="Добавлено"
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
 
     class Meta:
         abstract = True
@@ -81,25 +82,98 @@ class Post(PublishedModel):
         verbose_name="Категория",
     )
     image = models.ImageField("Картинка", upload_to="posts_images", null=True)
+    image_renditions = models.JSONField(
+        default=dict,
+        null=True,
+        editable=False,
+        verbose_name="Копии картинки",
+        help_text=(
+            "Размер оригинала, ширины и форматы готовых копий, основной "
+            "цвет и размытая миниатюра; пусто, пока картинка ждёт "
+            "обработчика картинок."
+        ),
+    )
+    is_visible = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Видна в лентах",
+        help_text="Публикация и её категория опубликованы.",
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество комментариев"
+    )
 
     class Meta:
         verbose_name = "публикация"
         verbose_name_plural = "Публикации"
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"),
+                condition=models.Q(is_visible=True),
+                name="post_visible_pub_date_idx",
+            ),
+            models.Index(
+                fields=("author", "pub_date"),
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=("category", "-pub_date", "-id"),
+                condition=models.Q(is_visible=True),
+                name="post_visible_category_idx",
+            ),
+            models.Index(
+                fields=("id",),
+                condition=models.Q(image_renditions__isnull=True),
+                name="post_image_pending_idx",
+            ),
+            models.Index(fields=("image",), name="post_image_idx"),
+        )
 
     def __str__(self):
         return self.title
 
 
+def cascade_with_post(collector, field, sub_objs, using):
+    """CASCADE that marks the comments as deleted together with their
+    post, so they need no counter or cache upkeep of their own."""
+    # The collector deletes these very instances.
+    for comment in sub_objs:
+        comment.deleted_with_post = True
+    models.CASCADE(collector, field, sub_objs, using)
+
+
 class Comment(models.Model):
     text = models.TextField("Оставить комментарий")
     post = models.ForeignKey(
-        Post, on_delete=models.CASCADE, related_name="comments"
+        Post, on_delete=cascade_with_post, related_name="comments"
     )
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
 
     class Meta:
         ordering = ("created_at",)
+        indexes = (
+            models.Index(
+                fields=("post", "created_at"),
+                name="comment_post_created_at_idx",
+            ),
+        )
 
     def __str__(self):
         return self.text[:50]
+
+
+class MediaFile(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    references = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ссылок",
+        help_text="Сколько публикаций используют файл.",
+    )
+
+    class Meta:
+        verbose_name = "файл"
+        verbose_name_plural = "Файлы"
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,242 @@
+import base64
+import json
+import math
+from collections.abc import Sequence
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .cache import FEED_COUNT_TIMEOUT, feed_count_key, feed_timeout
+
+CURSOR_PARAM = "cursor"
+LAST_PAGE_CURSOR = "last"
+MAX_OFFSET_PAGE = 10
+PAGES_ON_EACH_SIDE = 2
+PAGES_ON_ENDS = 1
+
+NEXT = "n"
+PREVIOUS = "p"
+# Ids beyond a signed 64-bit integer cannot even be sent to the database.
+MAX_KEY = 2**63 - 1
+
+
+class CursorMixin:
+    def _cursor_from(self, obj, direction):
+        return encode_cursor(
+            direction,
+            [getattr(obj, name) for name in self.paginator.key_fields],
+        )
+
+
+class FeedPage(CursorMixin, Page):
+    """Offset page that hands navigation over to cursors on deep pages."""
+
+    @property
+    def next_cursor(self):
+        if (
+            not self.has_next()
+            or self.number < self.paginator.max_offset_page
+        ):
+            return None
+        return self._cursor_from(self[len(self) - 1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if (
+            not self.has_previous()
+            or self.number <= self.paginator.max_offset_page
+        ):
+            return None
+        return self._cursor_from(self[0], PREVIOUS)
+
+    @property
+    def last_cursor(self):
+        if self.paginator.num_pages <= self.paginator.max_offset_page:
+            return None
+        return LAST_PAGE_CURSOR
+
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(
+            self.number,
+            on_each_side=PAGES_ON_EACH_SIDE,
+            on_ends=PAGES_ON_ENDS,
+        )
+
+
+class FeedPaginator(Paginator):
+    key_fields = ("pub_date", "id")
+    max_offset_page = MAX_OFFSET_PAGE
+
+    def _get_page(self, *args, **kwargs):
+        return FeedPage(*args, **kwargs)
+
+
+class OffsetPaginator(FeedPaginator):
+    """Page numbers only, for orderings a cursor cannot follow (rank)."""
+
+    max_offset_page = math.inf
+
+
+class CachedCountPaginator(FeedPaginator):
+    """Feed paginator that keeps the total in the cache between requests.
+
+    The count is stored per feed for ``FEED_COUNT_TIMEOUT`` seconds, or
+    until the next scheduled post of the feed goes live, and dropped
+    explicitly by the post and category signal handlers.
+    """
+
+    def __init__(self, object_list, per_page, feed, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        key = feed_count_key(self.feed)
+        count = cache.get(key)
+        if count is None:
+            # Before counting, for the same reason as the page cache.
+            timeout = feed_timeout(self.feed, FEED_COUNT_TIMEOUT)
+            count = self.object_list.count()
+            cache.set(key, count, timeout)
+        return count
+
+
+class KeysetPage(CursorMixin, Sequence):
+    number = None
+
+    def __init__(self, object_list, paginator, has_next, has_prev):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_prev
+
+    def __repr__(self):
+        return "<Keyset page>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self._cursor_from(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self._cursor_from(self.object_list[0], PREVIOUS)
+
+    @property
+    def last_cursor(self):
+        return LAST_PAGE_CURSOR
+
+
+class KeysetPaginator:
+    """Serve pages by seeking from a cursor instead of OFFSET.
+
+    ``ordering`` lists the key fields as in ``order_by()``; the last one
+    must be unique so that every row has a distinct position. No
+    ``COUNT(*)`` is ever issued: each page is a single range query that
+    fetches one extra row to find out whether there is a next page.
+    """
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id")):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.key_fields = tuple(name.lstrip("-") for name in self.ordering)
+
+    def _seek(self, queryset, values, direction):
+        model = queryset.model
+        values = [
+            model._meta.get_field(name).to_python(value)
+            for name, value in zip(self.key_fields, values)
+        ]
+        condition = Q()
+        for i, name in reversed(list(enumerate(self.key_fields))):
+            descending = self.ordering[i].startswith("-")
+            lookup = "lt" if descending == (direction == NEXT) else "gt"
+            step = Q(**{f"{name}__{lookup}": values[i]})
+            if condition:
+                step |= Q(**{name: values[i]}) & condition
+            condition = step
+        return queryset.filter(condition)
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith("-") else f"-{name}"
+            for name in self.ordering
+        ]
+
+    def get_page(self, cursor):
+        direction, values = decode_cursor(cursor)
+        if values is not None and len(values) != len(self.key_fields):
+            direction, values = NEXT, None
+        queryset = self.object_list
+        if values is not None:
+            try:
+                queryset = self._seek(queryset, values, direction)
+            except (TypeError, ValueError, ValidationError):
+                direction, values = NEXT, None
+        if direction == NEXT:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        return KeysetPage(rows, self, has_next, has_previous)
+
+
+def encode_cursor(direction, values):
+    values = [
+        value.isoformat() if hasattr(value, "isoformat") else value
+        for value in values
+    ]
+    payload = json.dumps([direction, values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return NEXT, None
+    if cursor == LAST_PAGE_CURSOR:
+        return PREVIOUS, None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        return NEXT, None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return NEXT, None
+    # Keys are dates, as ISO strings, and ids; anything else is forged.
+    if not all(
+        isinstance(value, str)
+        or type(value) is int and -MAX_KEY <= value <= MAX_KEY
+        for value in values
+    ):
+        return NEXT, None
+    return direction, values
@@ -0,0 +1,158 @@
+import logging
+import re
+import sys
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# The same query shape this many times in one request is an N+1 pattern.
+N_PLUS_ONE_THRESHOLD = 3
+PLACEHOLDER_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+RecordedQuery = namedtuple("RecordedQuery", "sql shape origin")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Declare how many queries a view may run per request.
+
+    Class-based views declare a ``query_budget`` attribute instead.
+    """
+
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+
+    return decorator
+
+
+def get_query_budget(view_func):
+    budget = getattr(view_func, "query_budget", None)
+    if budget is None:
+        budget = getattr(
+            getattr(view_func, "view_class", None), "query_budget", None
+        )
+    return budget
+
+
+def query_shape(sql):
+    sql = PLACEHOLDER_LIST_RE.sub("(...)", sql)
+    return NUMBER_RE.sub("?", sql)
+
+
+def query_origin():
+    """Name the template line or project code that ran the query."""
+    frame = sys._getframe(2)
+    app_frame = None
+    project_dir = str(settings.BASE_DIR)
+    this_file = str(Path(__file__))
+    while frame is not None:
+        node = frame.f_locals.get("self")
+        if frame.f_code.co_name == "render_annotated" and hasattr(
+            node, "token"
+        ):
+            return f"{node.origin.template_name}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if (
+            app_frame is None
+            and filename.startswith(project_dir)
+            and filename != this_file
+        ):
+            app_frame = f"{filename[len(project_dir) + 1:]}:{frame.f_lineno}"
+        frame = frame.f_back
+    return app_frame
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that remembers where queries ran."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(
+            RecordedQuery(sql, query_shape(sql), query_origin())
+        )
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Return ``(shape, count, origins)`` of the N+1 suspects."""
+        counts = Counter(query.shape for query in self.queries)
+        return [
+            (
+                shape,
+                count,
+                Counter(
+                    query.origin
+                    for query in self.queries
+                    if query.shape == shape
+                ),
+            )
+            for shape, count in counts.items()
+            if count >= threshold
+        ]
+
+    def describe(self, title, budget=None):
+        lines = [f"{title}: {len(self.queries)} запросов"]
+        if budget is not None:
+            lines[0] += f" при бюджете {budget}"
+        for shape, count, origins in self.repeated():
+            where = ", ".join(
+                f"{origin} ×{times}" for origin, times in origins.items()
+            )
+            lines.append(f"N+1: {count} × {shape}\n    из {where}")
+        lines += [f"  {query.origin}: {query.sql}" for query in self.queries]
+        return "\n".join(lines)
+
+
+@contextmanager
+def assert_query_budget(limit, title="Блок кода"):
+    """Fail if the block runs more than ``limit`` queries or repeats one
+    query shape often enough to look like N+1."""
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+    if len(recorder.queries) > limit or recorder.repeated():
+        raise QueryBudgetExceeded(recorder.describe(title, limit))
+
+
+class QueryBudgetMiddleware:
+    """Check every request against the query budget of its view.
+
+    Active while ``QUERY_BUDGET_ENABLED`` (``DEBUG`` by default) is on.
+    Overruns and N+1 patterns are logged; with ``QUERY_BUDGET_RAISE``,
+    as in tests, an overrun fails the request instead.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        budget = getattr(request, "query_budget", None)
+        over_budget = budget is not None and len(recorder.queries) > budget
+        if over_budget or recorder.repeated():
+            message = recorder.describe(
+                f"{request.method} {request.path}", budget
+            )
+            if over_budget and getattr(settings, "QUERY_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func)
@@ -0,0 +1,136 @@
+import os
+import posixpath
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from pathlib import Path
+
+from django.conf import settings
+
+from .images import (
+    EXTENSIONS,
+    RENDITION_WIDTHS,
+    encode,
+    open_image,
+    rendition_format,
+)
+
+SOURCE_DIR = "posts_images"
+# Sizes served unless RESIZE_SIZES says otherwise: the srcset widths
+# with any height. Limiting them keeps the cache from being filled with
+# every size a client can make up.
+DEFAULT_SIZES = [(width, 0) for width in RENDITION_WIDTHS]
+# Copies never change under their URL, as a changed source gets a new
+# cache file, but a URL does not name the file, so a year rather than
+# forever.
+MAX_AGE = 60 * 60 * 24 * 365
+
+
+class Overloaded(Exception):
+    """Too many resizes are already waiting for a worker."""
+
+
+def allowed_sizes():
+    sizes = getattr(settings, "RESIZE_SIZES", None) or DEFAULT_SIZES
+    return {tuple(size) for size in sizes}
+
+
+def source_path(path):
+    """Return the file under ``posts_images`` that ``path`` names, or
+    ``None``."""
+    # normpath folds "..", so a path leaving the directory loses the prefix.
+    path = posixpath.normpath(path)
+    if not path.startswith(f"{SOURCE_DIR}/"):
+        return None
+    source = Path(settings.MEDIA_ROOT) / path
+    return source if source.is_file() else None
+
+
+def cache_path(source, width, height):
+    """Where the copy of ``source`` fitted into ``width``×``height`` is
+    kept.
+
+    The name hashes the source's path and modification time, so a
+    changed file gets a new copy; two levels of 256 directories keep
+    each one small however many copies there are.
+    """
+    stat = source.stat()
+    key = sha1(
+        f"{source}:{stat.st_mtime_ns}:{width}x{height}".encode()
+    ).hexdigest()
+    extension = EXTENSIONS[rendition_format(source.name)]
+    return Path(
+        settings.RESIZE_CACHE_ROOT, key[:2], key[2:4], key + extension
+    )
+
+
+def render(source, target, width, height):
+    """Write ``source`` fitted into the box to ``target`` atomically."""
+    with open(source, "rb") as stream:
+        image, _ = open_image(stream, max(width, height))
+        image.thumbnail((width or image.width, height or image.height))
+        data = encode(
+            image,
+            rendition_format(source.name),
+            image.info.get("icc_profile"),
+        )
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Other processes may be writing the same copy; each renames its own
+    # complete file into place.
+    descriptor, temporary = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as output:
+        output.write(data)
+    os.replace(temporary, target)
+
+
+class ResizePool:
+    """Worker threads for resizing that share work on the same copy.
+
+    Pillow releases the GIL while it resizes and encodes, so threads
+    run in parallel. At most ``workers`` copies are made at once and at
+    most ``max_pending`` wait; beyond that ``submit`` raises
+    ``Overloaded`` instead of queueing without end. A request for a
+    copy that is already being made waits for the same future.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="resize"
+        )
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def submit(self, source, target, width, height):
+        with self.lock:
+            future = self.in_flight.get(target)
+            if future is not None:
+                return future
+            if len(self.in_flight) >= self.max_pending:
+                raise Overloaded
+            future = self.executor.submit(
+                render, source, target, width, height
+            )
+            self.in_flight[target] = future
+        future.add_done_callback(lambda _: self.forget(target))
+        return future
+
+    def forget(self, target):
+        with self.lock:
+            self.in_flight.pop(target, None)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ResizePool(
+                getattr(settings, "RESIZE_WORKERS", None) or os.cpu_count(),
+                getattr(settings, "RESIZE_MAX_PENDING", 64),
+            )
+        return _pool
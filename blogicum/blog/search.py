@@ -0,0 +1,259 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+SEARCH_TABLE = "blog_post_fts"
+TITLE_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+
+TITLE_TRIGRAM_TABLE = "blog_post_title_trgm"
+USERNAME_TRIGRAM_TABLE = "blog_username_trgm"
+SUGGEST_CANDIDATES = 50
+MIN_CHUNKED_TRIGRAMS = 5
+MIN_SIMILARITY = 0.5
+
+MIN_STEM_LENGTH = 3
+WORD_RE = re.compile(r"\w+")
+ENDING_RE = re.compile(r"[аеиоуыэюяйь]+$")
+
+
+def normalize(text):
+    # unicode61 folds the case of Cyrillic letters but keeps "ё" apart
+    # from "е", so both the index and the queries are normalised here.
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+
+def match_expression(query):
+    """Turn what a reader typed into a safe FTS5 ``MATCH`` expression.
+
+    Every word becomes a quoted prefix term with its vowel ending cut off,
+    which lets "публикации" find "публикация" without a real stemmer.
+    Returns ``None`` when the query has no words.
+    """
+    terms = []
+    for word in WORD_RE.findall(normalize(query).lower()):
+        stem = ENDING_RE.sub("", word)
+        if len(stem) < MIN_STEM_LENGTH:
+            stem = word
+        terms.append(f'"{stem}"*')
+    return " ".join(terms) or None
+
+
+def search_posts(queryset, query):
+    """Filter ``queryset`` down to posts matching ``query``, best first."""
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    matches = RawSQL(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        [expression],
+    )
+    # bm25() needs the MATCH in its own query, so the rank is looked up
+    # per post; FTS5 serves the rowid equality without a scan.
+    rank = RawSQL(
+        f"SELECT bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {TEXT_WEIGHT}) "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+        f"AND {SEARCH_TABLE}.rowid = {Post._meta.db_table}.id",
+        [expression],
+    )
+    return (
+        queryset.filter(pk__in=matches)
+        .annotate(search_rank=rank)
+        .order_by("search_rank", "-pub_date")
+    )
+
+
+def trigram_list(text):
+    text = normalize(text).lower()
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def trigrams(text):
+    return set(trigram_list(text))
+
+
+def similarity(query_trigrams, text):
+    """Share of the query's trigrams that also occur in ``text``."""
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams(text)) / len(query_trigrams)
+
+
+def candidate_expression(query):
+    """Build an FTS5 expression for rows within one typo of ``query``.
+
+    A typo spoils at most three adjacent trigrams, so once the query has
+    three pairs of them, a close title keeps at least one pair intact.
+    Requiring a whole pair is far more selective than any trigram alone.
+    """
+    quoted = [
+        '"{}"'.format(trigram.replace('"', '""'))
+        for trigram in trigram_list(query)
+    ]
+    if len(quoted) < MIN_CHUNKED_TRIGRAMS:
+        return " OR ".join(sorted(set(quoted)))
+    return " OR ".join(
+        "({})".format(" AND ".join(quoted[i:i + 2]))
+        for i in range(0, len(quoted), 2)
+    )
+
+
+def _suggest(sql, params, query, limit):
+    """Rank trigram candidates by similarity to ``query``.
+
+    FTS5 picks at most ``SUGGEST_CANDIDATES`` rows, best bm25 first, and
+    only those are scored here, so the Python side does not grow with
+    the table.
+    """
+    query_trigrams = trigrams(query)
+    if not query_trigrams:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql, [candidate_expression(query), *params, SUGGEST_CANDIDATES]
+        )
+        rows = cursor.fetchall()
+    scored = [(similarity(query_trigrams, row[-1]), row) for row in rows]
+    scored = [item for item in scored if item[0] >= MIN_SIMILARITY]
+    scored.sort(key=lambda item: (-item[0], len(item[1][-1])))
+    return [row for _, row in scored[:limit]]
+
+
+def suggest_posts(query, now, limit):
+    """Return ``(id, title)`` of visible posts whose title looks like
+    ``query``, typos included."""
+    return _suggest(
+        f"SELECT post.id, post.title FROM {TITLE_TRIGRAM_TABLE} "
+        f"JOIN blog_post AS post ON post.id = {TITLE_TRIGRAM_TABLE}.rowid "
+        f"WHERE {TITLE_TRIGRAM_TABLE} MATCH %s "
+        "AND post.is_visible AND post.pub_date <= %s "
+        f"ORDER BY {TITLE_TRIGRAM_TABLE}.rank LIMIT %s",
+        [now],
+        query,
+        limit,
+    )
+
+
+def suggest_usernames(query, limit):
+    return [
+        username
+        for (username,) in _suggest(
+            f"SELECT member.username FROM {USERNAME_TRIGRAM_TABLE} "
+            f"JOIN {get_user_model()._meta.db_table} AS member "
+            f"ON member.id = {USERNAME_TRIGRAM_TABLE}.rowid "
+            f"WHERE {USERNAME_TRIGRAM_TABLE} MATCH %s "
+            f"ORDER BY {USERNAME_TRIGRAM_TABLE}.rank LIMIT %s",
+            [],
+            query,
+            limit,
+        )
+    ]
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        _replace_row(
+            cursor,
+            SEARCH_TABLE,
+            post.pk,
+            {"title": normalize(post.title), "text": normalize(post.text)},
+        )
+        _replace_row(
+            cursor,
+            TITLE_TRIGRAM_TABLE,
+            post.pk,
+            {"title": normalize(post.title)},
+        )
+
+
+def unindex_post(pk):
+    with connection.cursor() as cursor:
+        for table in (SEARCH_TABLE, TITLE_TRIGRAM_TABLE):
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [pk])
+
+
+def index_user(user):
+    with connection.cursor() as cursor:
+        _replace_row(
+            cursor,
+            USERNAME_TRIGRAM_TABLE,
+            user.pk,
+            {"username": normalize(user.username)},
+        )
+
+
+def unindex_user(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {USERNAME_TRIGRAM_TABLE} WHERE rowid = %s", [pk]
+        )
+
+
+def rebuild_search_index(posts, users, batch_size=1000):
+    """Refill the search tables; return how many posts and users were
+    indexed."""
+    posts = posts.order_by("pk").values_list("pk", "title", "text")
+    indexed_posts = _refill(
+        SEARCH_TABLE,
+        ("title", "text"),
+        (
+            (pk, normalize(title), normalize(text))
+            for pk, title, text in posts.iterator(chunk_size=batch_size)
+        ),
+        batch_size,
+    )
+    _refill(
+        TITLE_TRIGRAM_TABLE,
+        ("title",),
+        (
+            (pk, normalize(title))
+            for pk, title, _ in posts.iterator(chunk_size=batch_size)
+        ),
+        batch_size,
+    )
+    indexed_users = _refill(
+        USERNAME_TRIGRAM_TABLE,
+        ("username",),
+        (
+            (pk, normalize(username))
+            for pk, username in users.order_by("pk")
+            .values_list("pk", "username")
+            .iterator(chunk_size=batch_size)
+        ),
+        batch_size,
+    )
+    return indexed_posts, indexed_users
+
+
+def _replace_row(cursor, table, pk, values):
+    cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [pk])
+    cursor.execute(
+        "INSERT INTO {} (rowid, {}) VALUES (%s{})".format(
+            table, ", ".join(values), ", %s" * len(values)
+        ),
+        [pk, *values.values()],
+    )
+
+
+def _refill(table, columns, rows, batch_size):
+    sql = "INSERT INTO {} (rowid, {}) VALUES (%s{})".format(
+        table, ", ".join(columns), ", %s" * len(columns)
+    )
+    indexed = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                cursor.executemany(sql, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            indexed += len(batch)
+    return indexed
@@ -0,0 +1,239 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import (
+    ALL_FEEDS,
+    INDEX_FEED,
+    author_feed,
+    bump_version,
+    category_feed,
+    invalidate_feeds,
+    post_feed,
+    post_feeds,
+    saved_post_feeds,
+)
+from .models import Category, Comment, Location, Post
+from .search import index_post, index_user, unindex_post, unindex_user
+from .storage import acquire, release
+
+User = get_user_model()
+
+# What pages show of a user: cards and comments the username, the
+# profile page the rest.
+SHOWN_USER_FIELDS = (
+    "username",
+    "first_name",
+    "last_name",
+    "is_staff",
+    "date_joined",
+)
+
+
+def category_feeds(category):
+    usernames = (
+        Post.objects.filter(category=category)
+        .order_by()
+        .values_list("author__username", flat=True)
+        .distinct()
+    )
+    # ALL_FEEDS drops every cached page but no cached count, so the
+    # index count, which the category's posts are part of, goes too.
+    return [INDEX_FEED, ALL_FEEDS, category_feed(category.slug)] + [
+        author_feed(username) for username in usernames
+    ]
+
+
+@receiver(pre_save, sender=Post)
+def track_post_changes(sender, instance, **kwargs):
+    instance.is_visible = bool(
+        instance.is_published
+        and instance.category_id is not None
+        and instance.category.is_published
+    )
+    stored_slug, stored_image, stored_author = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list("category__slug", "image", "author__username")
+        .first()
+        if instance.pk is not None
+        else None
+    ) or (None, None, None)
+    instance._stored_category_slug = stored_slug
+    instance._stored_author = stored_author
+    instance._stored_image = stored_image
+    # A new upload is not in storage yet and may still be renamed there.
+    if (
+        instance.image.name != stored_image
+        or not instance.image._committed
+    ):
+        # Queued for the image worker until it stores the copies made.
+        instance.image_renditions = None if instance.image else {}
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    stored_image, image = instance._stored_image, instance.image.name
+    if image == stored_image:
+        return
+    if image and acquire(image) and instance.image_renditions is None:
+        # The same file uploaded for another post already has its copies.
+        renditions = (
+            Post.objects.filter(image=image, image_renditions__isnull=False)
+            .exclude(pk=instance.pk)
+            .values_list("image_renditions", flat=True)
+            .first()
+        )
+        if renditions is not None:
+            Post.objects.filter(pk=instance.pk).update(
+                image_renditions=renditions
+            )
+            instance.image_renditions = renditions
+    if stored_image:
+        release(stored_image)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    bump_version("post", instance.pk)
+    slugs = {instance._stored_category_slug}
+    if instance.category_id is not None:
+        slugs.add(instance.category.slug)
+    username = instance.author.username if instance.author_id else None
+    feeds = post_feeds(username, slugs, instance.pk)
+    if instance._stored_author not in (None, username):
+        # Moved to another author: off the previous one's profile.
+        feeds += post_feeds(instance._stored_author, ())
+    invalidate_feeds(feeds)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_post_image(sender, instance, **kwargs):
+    if instance.image:
+        release(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    bump_version("post", instance.pk)
+    slugs = set()
+    if instance.category_id is not None:
+        category = Category.objects.filter(pk=instance.category_id).first()
+        slugs.add(category and category.slug)
+    author = User.objects.filter(pk=instance.author_id).first()
+    invalidate_feeds(
+        post_feeds(author and author.username, slugs, instance.pk)
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_posts_visibility(sender, instance, **kwargs):
+    Post.objects.filter(category=instance).update(
+        is_visible=F("is_published") if instance.is_published else False
+    )
+    bump_version("category", instance.pk)
+    invalidate_feeds(category_feeds(instance))
+
+
+@receiver(pre_delete, sender=Category)
+def hide_category_posts(sender, instance, **kwargs):
+    invalidate_feeds(category_feeds(instance))
+    Post.objects.filter(category=instance).update(is_visible=False)
+
+
+@receiver(post_save, sender=Location)
+def invalidate_location_cards(sender, instance, **kwargs):
+    bump_version("location", instance.pk)
+    invalidate_feeds([ALL_FEEDS])
+
+
+@receiver(pre_save, sender=User)
+def track_user_changes(sender, instance, update_fields, **kwargs):
+    instance._stored_shown_fields = None
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(update_fields) & set(SHOWN_USER_FIELDS)
+    ):
+        return
+    instance._stored_shown_fields = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*SHOWN_USER_FIELDS)
+        .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, created, **kwargs):
+    # A new user is on no page yet; a password change shows on none.
+    stored = instance._stored_shown_fields
+    if created or stored is None:
+        return
+    shown = tuple(getattr(instance, name) for name in SHOWN_USER_FIELDS)
+    if stored == shown:
+        return
+    stored_username = stored[SHOWN_USER_FIELDS.index("username")]
+    feeds = {
+        author_feed(username, include_hidden)
+        for username in (stored_username, instance.username)
+        for include_hidden in (False, True)
+    }
+    # The username is also on the cards of the user's posts and next to
+    # their comments, which may be on any page.
+    if stored_username != instance.username and (
+        Post.objects.filter(author=instance).exists()
+        or Comment.objects.filter(author=instance).exists()
+    ):
+        bump_version("user", instance.pk)
+        feeds.add(ALL_FEEDS)
+    invalidate_feeds(feeds)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    unindex_user(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def track_saved_comment(sender, instance, created, **kwargs):
+    posts = Post.objects.filter(pk=instance.post_id)
+    if not created:
+        posts.update(updated_at=timezone.now())
+        invalidate_feeds([post_feed(instance.post_id)])
+        return
+    posts.update(
+        comment_count=F("comment_count") + 1, updated_at=timezone.now()
+    )
+    invalidate_feeds(saved_post_feeds(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def track_deleted_comment(sender, instance, **kwargs):
+    if getattr(instance, "deleted_with_post", False):
+        return
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F("comment_count") - 1, updated_at=timezone.now()
+    )
+    invalidate_feeds(saved_post_feeds(instance.post_id))
@@ -0,0 +1,203 @@
+import os
+import posixpath
+import re
+import tempfile
+from hashlib import sha256
+from itertools import islice
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import MediaFile, Post
+
+CHUNK_SIZE = 64 * 1024
+# Two levels of 256 directories: a few dozen files in each at ten
+# million files.
+SHARD_LEVELS = 2
+CONTENT_NAME_RE = re.compile(
+    r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\w+)?$"
+)
+RECOUNT_BATCH_SIZE = 1000
+
+
+def content_name(directory, digest, extension):
+    """``posts_images/3f/a2/3fa2….jpg`` for a file hashed to ``3fa2…``."""
+    shards = [digest[i * 2:i * 2 + 2] for i in range(SHARD_LEVELS)]
+    return posixpath.join(directory, *shards, digest + extension.lower())
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME_RE.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Keeps each distinct file once, named after the SHA-256 of its
+    content.
+
+    An upload of ``posts_images/photo.jpg`` is stored as
+    ``posts_images/3f/a2/3fa2….jpg``, so directories stay small however
+    many files there are, and an identical upload gets the name of the
+    file already stored instead of another copy. Copies made from a
+    file, such as renditions, are named after it and stored as given
+    with ``save_copy``. Which files are still used is counted by
+    ``acquire`` and ``release``.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        directory, basename = posixpath.split(name)
+        extension = posixpath.splitext(basename)[1]
+        # Hashed while written, so the upload is read once.
+        digest = sha256()
+        temporary = self._write(self.path(directory), content, digest)
+        name = content_name(directory, digest.hexdigest(), extension)
+        if max_length is not None and len(name) > max_length:
+            os.remove(temporary)
+            raise SuspiciousFileOperation(
+                f'Storage can not find an available filename for "{name}".'
+            )
+        self._place(temporary, name)
+        return name
+
+    def save_copy(self, name, content):
+        """Store ``content`` under ``name`` as given, replacing the file
+        there."""
+        directory = os.path.dirname(self.path(name))
+        self._place(self._write(directory, content), name)
+        return name
+
+    def adopt(self, name, copies=()):
+        """Link a file stored under another name, and its ``copies``,
+        to its content-addressed name.
+
+        The old files are left for the caller to delete once nothing
+        refers to them. Returns the new name.
+        """
+        digest = sha256()
+        with self.open(name) as stream:
+            for chunk in stream.chunks(CHUNK_SIZE):
+                digest.update(chunk)
+        directory, basename = posixpath.split(name)
+        new_name = content_name(
+            directory, digest.hexdigest(), posixpath.splitext(basename)[1]
+        )
+        stem, new_stem = (posixpath.splitext(n)[0] for n in (name, new_name))
+        for old, new in [(name, new_name)] + [
+            (copy, new_stem + copy[len(stem):]) for copy in copies
+        ]:
+            if self.exists(old) and not self.exists(new):
+                os.makedirs(os.path.dirname(self.path(new)), exist_ok=True)
+                try:
+                    os.link(self.path(old), self.path(new))
+                except FileExistsError:
+                    pass
+        return new_name
+
+    def delete_with_copies(self, name):
+        """Delete a content-addressed file and the copies named after
+        it."""
+        directory, basename = os.path.split(self.path(name))
+        prefix = basename.split(".")[0] + "."
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.startswith(prefix):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _write(self, directory, content, digest=None):
+        """Write ``content`` to a new temporary file in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=directory, prefix=".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if digest is not None:
+                        digest.update(chunk)
+                    output.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return temporary
+
+    def _place(self, temporary, name):
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Another process may be storing the same file; either complete
+        # file will do.
+        os.replace(temporary, target)
+
+
+def _add_reference(name):
+    return MediaFile.objects.filter(name=name).update(
+        references=F("references") + 1
+    )
+
+
+def acquire(name):
+    """Count one more post using the stored file ``name``.
+
+    Returns whether other posts already used it.
+    """
+    if _add_reference(name):
+        return True
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        # Counted by a concurrent upload of the same file.
+        return bool(_add_reference(name))
+    return False
+
+
+def release(name):
+    """Count one post less using ``name``; the file and its copies are
+    deleted with the last one once the transaction commits.
+
+    An identical upload arriving between the last release and the
+    deletion loses its file; the window is a single request.
+    """
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F("references") - 1
+    )
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    if deleted and is_content_name(name):
+        transaction.on_commit(
+            lambda: default_storage.delete_with_copies(name)
+        )
+
+
+def recount_references():
+    """Rebuild the reference counts from the images posts use."""
+    counts = (
+        Post.objects.exclude(image="")
+        .exclude(image__isnull=True)
+        .order_by()
+        .values_list("image")
+        .annotate(references=Count("pk"))
+        .iterator()
+    )
+    with transaction.atomic():
+        MediaFile.objects.all().delete()
+        while True:
+            batch = [
+                MediaFile(name=name, references=references)
+                for name, references in islice(counts, RECOUNT_BATCH_SIZE)
+            ]
+            if not batch:
+                break
+            MediaFile.objects.bulk_create(batch)
@@ -0,0 +1,17 @@
+from django import template
+
+from blog import images
+
+register = template.Library()
+
+
+@register.filter
+def srcset(post):
+    """``srcset`` in the upload's own format."""
+    return images.srcset(post.image, post.image_renditions)
+
+
+@register.filter
+def image_sources(post):
+    """``(type, srcset)`` pairs for the ``<source>`` tags of a post image."""
+    return images.sources(post.image, post.image_renditions)
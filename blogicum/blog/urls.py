@@ -20,11 +20,24 @@ urlpatterns = [
     path(
         "posts/<int:pk>/", views.PostDetailView.as_view(), name="post_detail"
     ),
+    path(
+        "posts/<int:pk>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path(
         "posts/<int:post_id>/delete/",
         views.PostDeleteView.as_view(),
         name="delete_post",
     ),
+    path("search/", views.search, name="search"),
+    path("autocomplete/", views.autocomplete, name="autocomplete"),
+    path("metrics", views.metrics, name="metrics"),
+    path(
+        "media/resize/<int:width>x<int:height>/<path:path>",
+        views.resized_image,
+        name="resized_image",
+    ),
     path("profile/edit/", views.edit_profile, name="edit_profile"),
     path("profile/<username>/", views.profile_detail, name="profile"),
     path(
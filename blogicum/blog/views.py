@@ -6,21 +6,62 @@ from django.views.generic import (
     UpdateView,
 )
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404, render, redirect
 from django.utils import timezone
 from django.urls import reverse_lazy, reverse
-from django.db.models import Count, Q
-from django.http import HttpResponseForbidden
+from django.db import transaction
+from django.db.models import Q
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
 
 from .forms import PostForm, CommentForm, UserForm
+from .cache import (
+    INDEX_FEED,
+    attach_card_versions,
+    author_feed,
+    cache_anonymous_page,
+    category_feed,
+    conditional_page,
+    feed_versions,
+    post_feed,
+)
+from .paginators import (
+    CURSOR_PARAM,
+    CachedCountPaginator,
+    FeedPaginator,
+    KeysetPaginator,
+    OffsetPaginator,
+)
+from .images import IMAGE_ERRORS
+from .metrics import CONTENT_TYPE, exposition
+from .query_budget import query_budget
+from .resize import (
+    MAX_AGE,
+    Overloaded,
+    allowed_sizes,
+    cache_path,
+    get_pool,
+    source_path,
+)
+from .search import search_posts, suggest_posts, suggest_usernames
 from blog.models import Post, Category, Comment
 
 
 NUM_OF_PUB = 5
 PAGINATE_BY = 10
+COMMENTS_PER_PAGE = 20
+SUGGESTIONS_LIMIT = 5
 
 
 class PostMixin:
@@ -35,20 +76,158 @@ class CommentMixin:
     template_name = "blog/comment.html"
 
 
+class FeedPaginationMixin:
+    paginator_class = FeedPaginator
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(CURSOR_PARAM)
+        if cursor is None:
+            paginator, page, object_list, is_paginated = (
+                super().paginate_queryset(queryset, page_size)
+            )
+        else:
+            paginator = KeysetPaginator(queryset, page_size)
+            page = paginator.get_page(cursor)
+            is_paginated = page.has_other_pages()
+        attach_card_versions(page)
+        return paginator, page, page.object_list, is_paginated
+
+
+def get_comments_page(request, post):
+    paginator = KeysetPaginator(
+        post.comments.select_related("author"),
+        COMMENTS_PER_PAGE,
+        ordering=("created_at", "id"),
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
+
+
+def get_readable_posts(user):
+    posts = Post.objects.select_related("author", "category", "location")
+    if not user.is_authenticated:
+        return posts.filter(is_visible=True, pub_date__lte=timezone.now())
+    return posts.filter(Q(is_published=True) | Q(author=user))
+
+
+def paginate_feed(request, queryset, feed):
+    cursor = request.GET.get(CURSOR_PARAM)
+    if cursor is not None:
+        return KeysetPaginator(queryset, PAGINATE_BY).get_page(cursor)
+    paginator = CachedCountPaginator(queryset, PAGINATE_BY, feed)
+    return paginator.get_page(request.GET.get("page"))
+
+
+def get_feed_page(request, queryset, feed):
+    page = paginate_feed(request, queryset, feed)
+    attach_card_versions(page)
+    return page
+
+
+def get_feed_state(request, queryset, feed, *stamps):
+    page = paginate_feed(
+        request,
+        queryset.values_list(
+            "pk",
+            "updated_at",
+            "pub_date",
+            "category__updated_at",
+            "location__updated_at",
+        ),
+        feed,
+    )
+    rows = list(page)
+    parts = (
+        rows,
+        stamps,
+        page.has_previous(),
+        page.has_next(),
+        getattr(page.paginator, "count", None),
+        feed_versions(feed),
+    )
+    # No Last-Modified: a post leaving the page leaves only older rows,
+    # so a date from them could answer 304 to a changed page. The ETag
+    # covers removals through the feed versions.
+    return parts, None
+
+
+def get_profile_posts(request, profile_id, username):
+    posts = (
+        Post.objects.filter(author_id=profile_id)
+        .order_by("-pub_date", "-id")
+        .select_related("author", "category", "location")
+    )
+    is_owner = (
+        request.user.is_authenticated and request.user.username == username
+    )
+    if not is_owner:
+        posts = posts.filter(
+            is_visible=True,
+            pub_date__lte=timezone.now(),
+        )
+    return posts, author_feed(username, include_hidden=is_owner)
+
+
+def index_state(request):
+    return get_feed_state(request, get_queryset_vis_pub(), INDEX_FEED)
+
+
+def category_state(request, category_slug):
+    updated_at = (
+        Category.objects.filter(slug=category_slug, is_published=True)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+    if updated_at is None:
+        return None
+    return get_feed_state(
+        request,
+        get_queryset_vis_pub().filter(category__slug=category_slug),
+        category_feed(category_slug),
+        updated_at,
+    )
+
+
+def profile_state(request, username):
+    profile = (
+        User.objects.filter(username=username)
+        .values_list(
+            "pk", "first_name", "last_name", "is_staff", "date_joined"
+        )
+        .first()
+    )
+    if profile is None:
+        return None
+    profile_id, *shown = profile
+    # The profile's own fields are on the page, so they are in the ETag.
+    return get_feed_state(
+        request, *get_profile_posts(request, profile_id, username), *shown
+    )
+
+
+def post_state(request, pk):
+    post = get_readable_posts(request.user).filter(pk=pk).first()
+    request.readable_post = post
+    if post is None:
+        return None
+    stamps = [post.updated_at]
+    for related in (post.category, post.location):
+        if related is not None:
+            stamps.append(related.updated_at)
+    return (stamps, feed_versions(post_feed(pk))), max(stamps)
+
+
 def get_queryset_vis_pub():
     return (
         Post.objects.filter(
-            category__is_published=True,
-            is_published=True,
+            is_visible=True,
             pub_date__lte=timezone.now(),
         )
-        .order_by("-pub_date")
+        .order_by("-pub_date", "-id")
         .select_related("author", "category", "location")
-        .annotate(comment_count=Count("comments"))
     )
 
 
-class PostListView(PostMixin, ListView):
+class PostListView(FeedPaginationMixin, PostMixin, ListView):
     template_name = "blog/index.html"
     paginate_by = PAGINATE_BY
 
@@ -57,6 +236,8 @@ class PostListView(PostMixin, ListView):
 
 
 class PostCreateView(LoginRequiredMixin, PostMixin, CreateView):
+    query_budget = 15
+
     def form_valid(self, form):
         form.instance.author = self.request.user
         return super().form_valid(form)
@@ -68,12 +249,13 @@ class PostCreateView(LoginRequiredMixin, PostMixin, CreateView):
 
 
 class PostDeleteView(LoginRequiredMixin, PostMixin, DeleteView):
+    query_budget = 15
     success_url = reverse_lazy("blog:index")
     pk_url_kwarg = "post_id"
 
     def dispatch(self, request, *args, **kwargs):
         post = self.get_object()
-        if post.author.id == request.user.id:
+        if post.author_id == request.user.id:
             return super().dispatch(request, *args, **kwargs)
         return self.handle_no_permission()
 
@@ -81,30 +263,45 @@ class PostDeleteView(LoginRequiredMixin, PostMixin, DeleteView):
         return redirect("login")
 
 
-class PostDetailView(LoginRequiredMixin, DetailView):
+@method_decorator(
+    [cache_anonymous_page(post_feed), conditional_page(post_state)],
+    name="dispatch",
+)
+class PostDetailView(DetailView):
+    query_budget = 5
     model = Post
     template_name = "blog/detail.html"
 
-    def dispatch(self, request, *args, **kwargs):
-        get_object_or_404(
-            Post,
-            Q(is_published=True) | Q(author=request.user.id),
-            pk=kwargs[self.pk_url_kwarg],
-        )
-        return super().dispatch(request, *args, **kwargs)
+    def get_queryset(self):
+        return get_readable_posts(self.request.user)
+
+    def get_object(self, queryset=None):
+        post = getattr(self.request, "readable_post", None)
+        if post is not None:
+            return post
+        return super().get_object(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = get_object_or_404(Post, pk=self.kwargs[self.pk_url_kwarg])
         context["form"] = CommentForm()
-        context["comments"] = post.comments.select_related("author")
+        context["comments"] = get_comments_page(self.request, self.object)
         return context
 
 
+@query_budget(4)
+@cache_anonymous_page(post_feed)
+def post_comments(request, pk):
+    post = get_object_or_404(get_readable_posts(request.user), pk=pk)
+    context = {"post": post, "comments": get_comments_page(request, post)}
+    return render(request, "includes/comment_list.html", context)
+
+
 class PostUpdateView(LoginRequiredMixin, PostMixin, UpdateView):
+    query_budget = 22
+
     def dispatch(self, request, *args, **kwargs):
         instance = get_object_or_404(Post, pk=kwargs["pk"])
-        if instance.author != request.user:
+        if instance.author_id != request.user.id:
             return redirect(
                 reverse("blog:post_detail", kwargs={"pk": instance.pk})
             )
@@ -114,34 +311,19 @@ class PostUpdateView(LoginRequiredMixin, PostMixin, UpdateView):
         return reverse("blog:post_detail", kwargs={"pk": self.kwargs["pk"]})
 
 
+@query_budget(8)
+@cache_anonymous_page(author_feed)
+@conditional_page(profile_state)
 def profile_detail(request, username):
     template = "blog/profile.html"
     profile = get_object_or_404(User, username=username)
-    posts = (
-        Post.objects.all()
-        .annotate(comment_count=Count("comments"))
-        .filter(
-            author__username=username,
-        )
-        .order_by("-pub_date")
-    )
-
-    if not (
-        request.user.is_authenticated and request.user.username == username
-    ):
-        posts = posts.filter(
-            is_published=True,
-            pub_date__lte=timezone.now(),
-            category__is_published=True,
-        )
-
-    paginator = Paginator(posts, PAGINATE_BY)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    posts, feed = get_profile_posts(request, profile.pk, username)
+    page_obj = get_feed_page(request, posts, feed)
     context = {"profile": profile, "page_obj": page_obj}
     return render(request, template, context)
 
 
+@query_budget(7)
 @login_required
 def edit_profile(request):
     form = UserForm(request.POST or None, instance=request.user)
@@ -151,29 +333,121 @@ def edit_profile(request):
     return render(request, "blog/user.html", {"form": form})
 
 
-class IndexListView(ListView):
+@method_decorator(
+    [cache_anonymous_page(lambda: INDEX_FEED), conditional_page(index_state)],
+    name="dispatch",
+)
+class IndexListView(FeedPaginationMixin, ListView):
+    query_budget = 7
     model = Post
     template_name = "blog/index.html"
     paginate_by = PAGINATE_BY
+    paginator_class = CachedCountPaginator
+
+    def get_paginator(self, *args, **kwargs):
+        return super().get_paginator(*args, feed=INDEX_FEED, **kwargs)
 
     def get_queryset(self):
         return get_queryset_vis_pub()
 
 
+@query_budget(9)
+@cache_anonymous_page(category_feed)
+@conditional_page(category_state)
 def category_posts(request, category_slug):
     template = "blog/category.html"
     category = get_object_or_404(
         Category, slug=category_slug, is_published=True
     )
     post_list = get_queryset_vis_pub().filter(category=category)
-    paginator = Paginator(post_list, PAGINATE_BY)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_feed_page(
+        request, post_list, category_feed(category_slug)
+    )
     context = {"category": category, "page_obj": page_obj}
     return render(request, template, context)
 
 
+@query_budget(4)
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = None
+    if query:
+        paginator = OffsetPaginator(
+            search_posts(get_queryset_vis_pub(), query), PAGINATE_BY
+        )
+        page_obj = paginator.get_page(request.GET.get("page"))
+        attach_card_versions(page_obj)
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+        "page_query": urlencode({"q": query}) + "&",
+    }
+    return render(request, "blog/search.html", context)
+
+
+@query_budget(3)
+def autocomplete(request):
+    query = request.GET.get("q", "").strip()
+    posts = suggest_posts(query, timezone.now(), SUGGESTIONS_LIMIT)
+    usernames = suggest_usernames(query, SUGGESTIONS_LIMIT)
+    return JsonResponse(
+        {
+            "posts": [
+                {
+                    "title": title,
+                    "url": reverse("blog:post_detail", args=[pk]),
+                }
+                for pk, title in posts
+            ],
+            "users": [
+                {
+                    "username": username,
+                    "url": reverse("blog:profile", args=[username]),
+                }
+                for username in usernames
+            ],
+        }
+    )
+
+
+@query_budget(0)
+def metrics(request):
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", None)
+    if allowed_ips is not None and request.META["REMOTE_ADDR"] not in (
+        allowed_ips
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+@query_budget(0)
+def resized_image(request, width, height, path):
+    """Serve a post image fitted into ``width``×``height``; 0 leaves that
+    side free. The copy is made on first request and kept on disk."""
+    source = source_path(path)
+    if (width, height) not in allowed_sizes() or source is None:
+        raise Http404
+    target = cache_path(source, width, height)
+    if not target.exists():
+        try:
+            get_pool().submit(source, target, width, height).result()
+        except Overloaded:
+            return HttpResponse(status=503, headers={"Retry-After": "1"})
+        except IMAGE_ERRORS:
+            raise Http404
+    etag = quote_etag(target.stem)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(target, "rb"))
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=MAX_AGE, immutable=True)
+    return response
+
+
 class CommentCreateView(CommentMixin, LoginRequiredMixin, CreateView):
+    query_budget = 9
+
+    @transaction.atomic
     def form_valid(self, form):
         post = get_object_or_404(Post, id=self.kwargs["post_id"])
         form.instance.author = self.request.user
@@ -187,6 +461,7 @@ class CommentCreateView(CommentMixin, LoginRequiredMixin, CreateView):
 
 
 class CommentUpdateView(LoginRequiredMixin, CommentMixin, UpdateView):
+    query_budget = 8
     pk_url_kwarg = "comment_id"
 
     def get_success_url(self):
@@ -196,14 +471,19 @@ class CommentUpdateView(LoginRequiredMixin, CommentMixin, UpdateView):
 
     def dispatch(self, request, *args, **kwargs):
         comment_update = get_object_or_404(Comment, pk=kwargs["comment_id"])
-        if comment_update.author != request.user:
+        if comment_update.author_id != request.user.id:
             return HttpResponseForbidden()
         return super().dispatch(request, *args, **kwargs)
 
 
 class CommentDeleteView(LoginRequiredMixin, CommentMixin, DeleteView):
+    query_budget = 11
     pk_url_kwarg = "comment_id"
 
+    @transaction.atomic
+    def delete(self, request, *args, **kwargs):
+        return super().delete(request, *args, **kwargs)
+
     def get_success_url(self):
         return reverse(
             "blog:post_detail", kwargs={"pk": self.kwargs["post_id"]}
@@ -211,6 +491,6 @@ class CommentDeleteView(LoginRequiredMixin, CommentMixin, DeleteView):
 
     def dispatch(self, request, *args, **kwargs):
         comment_delete = get_object_or_404(Comment, pk=kwargs["comment_id"])
-        if comment_delete.author != request.user:
+        if comment_delete.author_id != request.user.id:
             return HttpResponseForbidden()
         return super().dispatch(request, *args, **kwargs)
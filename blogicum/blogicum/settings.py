@@ -30,7 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "blog.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "blog.query_budget.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -40,10 +42,22 @@ MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+QUERY_BUDGET_ENABLED = DEBUG
+
+QUERY_BUDGET_RAISE = False
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+METRICS_ENABLED = True
+
+# Addresses allowed to scrape /metrics; None opens it to everyone.
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Set to a shared directory when the server runs several worker processes.
+METRICS_MULTIPROCESS_DIR = None
+
 ROOT_URLCONF = "blogicum.urls"
 
 TEMPLATES_DIR = BASE_DIR / "templates"
@@ -58,13 +72,25 @@ EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are stored once per content under sharded hash names.
+DEFAULT_FILE_STORAGE = "blog.storage.ContentAddressedStorage"
+
+# Copies made by /media/resize/; safe to delete at any time.
+RESIZE_CACHE_ROOT = BASE_DIR / "resize_cache"
+
+# Threads resizing at once (None: one per CPU) and resizes allowed to wait.
+RESIZE_WORKERS = None
+
+RESIZE_MAX_PENDING = 64
+
 LOGIN_REDIRECT_URL = "blog:index"
 
 LOGIN_URL = "/auth/login/"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "blog.metrics.DjangoTemplates",
+        "NAME": "django",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -0,0 +1,91 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_percentiles_use_nearest_rank():
+    from blog.management.commands.benchmark_views import percentile, summarize
+
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    summary = summarize(values, [3, 5, 4], 2048)
+    assert summary["p90_ms"] == 90.0
+    assert summary["queries"] == 5
+    assert summary["peak_memory_kib"] == 2.0
+
+
+def test_benchmark_measures_every_view():
+    from blog.management.commands.benchmark_views import Command
+
+    call_command(
+        "generate_dataset",
+        posts=30,
+        comments=60,
+        users=3,
+        unpublished=0,
+        scheduled=0,
+        stdout=StringIO(),
+    )
+    command = Command(stdout=StringIO())
+    results = command.measure(repeat=2)
+    assert results["posts"] == 30
+    assert set(results["views"]) == {
+        "index",
+        "index_deep",
+        "category_posts",
+        "profile_detail",
+        "post_detail",
+        "index_anonymous",
+        "comment_create",
+        "comment_edit",
+        "comment_delete",
+    }
+    for name, summary in results["views"].items():
+        assert summary["requests"] == 2
+        assert summary["queries"] > 0, name
+        assert summary["p50_ms"] <= summary["max_ms"]
+
+
+def test_benchmark_leaves_configured_cache_and_settings(
+    monkeypatch, tmp_path
+):
+    from django.core.cache import cache
+    from django.db import connection
+
+    from blog.management.commands import benchmark_views
+    from blog.management.commands.benchmark_views import Command
+
+    test_name = connection.settings_dict["TEST"].get("NAME")
+    cache.set("kept", "value")
+    # pytest-django has already set up the test environment.
+    for name in ("setup_test_environment", "teardown_test_environment"):
+        monkeypatch.setattr(
+            benchmark_views, name, lambda *args, **kwargs: None
+        )
+    monkeypatch.setattr(
+        connection.creation, "create_test_db", lambda **kwargs: "old"
+    )
+    monkeypatch.setattr(
+        connection.creation, "destroy_test_db", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr(Command, "grow", lambda self, size, seed: None)
+
+    def measure(self, repeat):
+        cache.clear()
+        return {}
+
+    monkeypatch.setattr(Command, "measure", measure)
+    call_command(
+        "benchmark_views",
+        sizes="10",
+        output=str(tmp_path / "benchmark.json"),
+        stdout=StringIO(),
+    )
+    assert cache.get("kept") == "value", (
+        "Убедитесь, что замеры работают с отдельным кешем."
+    )
+    assert connection.settings_dict["TEST"].get("NAME") == test_name
@@ -0,0 +1,90 @@
+import io
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+pytestmark = [pytest.mark.django_db]
+
+FIXTURE = [
+    {
+        "model": "blog.category",
+        "pk": 10,
+        "fields": {
+            "created_at": "2022-12-18T23:03:52.159Z",
+            "is_published": True,
+            "title": "Путешествия",
+            "slug": "travel",
+            "description": "Куда съездить.",
+        },
+    },
+    {
+        "model": "blog.post",
+        "pk": 20,
+        "fields": {
+            "created_at": "2022-12-18T23:06:18.993Z",
+            "is_published": True,
+            "title": "Поездка в Ярославль",
+            "text": "Ехали всю ночь.",
+            "pub_date": "1897-02-13T00:00:00Z",
+            "author": 30,
+            "category": 10,
+            "location": None,
+        },
+    },
+    {
+        "model": "auth.user",
+        "pk": 30,
+        "fields": {
+            "password": "!",
+            "username": "traveller",
+            "date_joined": "2022-12-18T22:57:29.299Z",
+            "groups": [],
+            "user_permissions": [],
+        },
+    },
+    {
+        "model": "blog.comment",
+        "pk": 40,
+        "fields": {
+            "text": "Завидую!",
+            "post": 20,
+            "author": 30,
+            "created_at": "2022-12-19T10:00:00Z",
+        },
+    },
+    {"model": "sessions.session", "pk": "x", "fields": {}},
+]
+
+
+def test_json_array_is_read_incrementally():
+    from blog.management.commands.bulk_loaddata import iter_json_array
+
+    text = json.dumps(FIXTURE, ensure_ascii=False, indent=2)
+    for read_size in (1, 7, 4096):
+        items = list(iter_json_array(io.StringIO(text), read_size))
+        assert items == FIXTURE
+    assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+    assert list(iter_json_array(io.StringIO("[1, 23]"), 1)) == [1, 23]
+
+
+def test_bulk_loaddata_loads_in_dependency_order(tmp_path, client):
+    from blog.models import Comment, Post
+
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps(FIXTURE), encoding="utf-8")
+    out = StringIO()
+    call_command("bulk_loaddata", str(path), batch_size=1, stdout=out)
+    assert "записей/с" in out.getvalue()
+
+    post = Post.objects.get(pk=20)
+    assert post.author.username == "traveller"
+    assert (
+        post.created_at.year == 2022
+    ), "Убедитесь, что при загрузке сохраняются даты создания из фикстуры."
+    assert post.is_visible and post.comment_count == 1
+    assert Comment.objects.get(pk=40).created_at.day == 19
+
+    response = client.get("/search/", {"q": "ярославль"})
+    assert [found.id for found in response.context["page_obj"]] == [20]
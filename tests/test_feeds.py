@@ -0,0 +1,540 @@
+import base64
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import Mixer
+
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def many_published_posts(mixer: Mixer, user, published_category):
+    return mixer.cycle(N_PER_PAGE * 2 + 5).blend(
+        "blog.Post", author=user, category=published_category
+    )
+
+
+def _walk_feed(client, url, cursor_key):
+    ids = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(url, {"cursor": cursor})
+        assert response.status_code == 200
+        page_obj = response.context["page_obj"]
+        ids.extend(post.id for post in page_obj)
+        cursor = getattr(page_obj, cursor_key)
+    return ids
+
+
+def test_keyset_pagination_walks_whole_feed(
+    client, user, published_category, many_published_posts
+):
+    from blog.models import Post
+
+    expected = list(
+        Post.objects.order_by("-pub_date", "-id").values_list("id", flat=True)
+    )
+    for url in (
+        "/",
+        f"/category/{published_category.slug}/",
+        f"/profile/{user.username}/",
+    ):
+        assert _walk_feed(client, url, "next_cursor") == expected, (
+            "Убедитесь, что переход по курсору `next_cursor` обходит ленту "
+            f"{url} без пропусков и повторов."
+        )
+
+    response = client.get("/", {"cursor": "last"})
+    page_obj = response.context["page_obj"]
+    assert [post.id for post in page_obj] == expected[-len(page_obj):]
+    backwards = []
+    while page_obj is not None:
+        backwards[:0] = [post.id for post in page_obj]
+        if not page_obj.previous_cursor:
+            break
+        page_obj = client.get(
+            "/", {"cursor": page_obj.previous_cursor}
+        ).context["page_obj"]
+    assert backwards == expected
+
+
+def test_keyset_page_issues_no_count(client, many_published_posts):
+    first = client.get("/", {"cursor": ""}).context["page_obj"]
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/", {"cursor": first.next_cursor})
+    assert len(response.context["page_obj"]) == N_PER_PAGE
+    assert not any("COUNT(*)" in q["sql"] for q in queries.captured_queries)
+
+
+def test_invalid_cursor_falls_back_to_first_page(
+    client, many_published_posts
+):
+    response = client.get("/", {"cursor": "not-a-cursor"})
+    assert response.status_code == 200
+    assert len(response.context["page_obj"]) == N_PER_PAGE
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        '["n",[1,1]]',
+        '["n",[{},1]]',
+        '["n",[null,null]]',
+        '["n",[true,1]]',
+        '["n",["2020-01-01T00:00:00+00:00","x"]]',
+        '["p",["2020-01-01T00:00:00+00:00",99999999999999999999999]]',
+    ],
+)
+def test_malformed_cursor_falls_back_to_first_page(
+    client, many_published_posts, payload
+):
+    cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+    response = client.get("/", {"cursor": cursor})
+    assert response.status_code == 200, (
+        "Убедитесь, что подделанный курсор не приводит к ошибке сервера."
+    )
+    assert len(response.context["page_obj"]) == N_PER_PAGE
+
+
+def test_comment_count_is_maintained(
+    mixer: Mixer, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    comments = mixer.cycle(3).blend("blog.Comment", post=post)
+    mixer.blend("blog.Comment", post=post, author=another_user)
+    post.refresh_from_db()
+    assert post.comment_count == 4, (
+        "Убедитесь, что счётчик комментариев увеличивается при создании "
+        "комментария."
+    )
+
+    comments[0].delete()
+    another_user.delete()
+    post.refresh_from_db()
+    assert post.comment_count == 2, (
+        "Убедитесь, что счётчик комментариев уменьшается при удалении "
+        "комментария, в том числе каскадном."
+    )
+
+    type(post).objects.update(comment_count=0)
+    call_command("rebuild_comment_counts", stdout=StringIO())
+    post.refresh_from_db()
+    assert post.comment_count == 2
+
+
+def test_feed_queries_do_not_aggregate(client, many_published_posts):
+    with CaptureQueriesContext(connection) as queries:
+        client.get("/")
+    assert not any("GROUP BY" in q["sql"] for q in queries.captured_queries)
+
+
+@pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite-only"
+)
+def test_hot_queries_use_indexes(user, published_category):
+    from blog.models import Comment, Post
+    from blog.views import get_queryset_vis_pub
+
+    plans = {
+        "post_visible_pub_date_idx": get_queryset_vis_pub()[:10],
+        "post_visible_category_idx": get_queryset_vis_pub().filter(
+            category=published_category
+        )[:10],
+        "post_author_pub_date_idx": Post.objects.filter(author=user).order_by(
+            "-pub_date", "-id"
+        )[:10],
+        "comment_post_created_at_idx": Comment.objects.filter(post_id=1),
+    }
+    for index_name, queryset in plans.items():
+        plan = queryset.explain()
+        assert f"USING INDEX {index_name}" in plan, (
+            f"Убедитесь, что запрос использует индекс `{index_name}`:\n{plan}"
+        )
+
+
+def test_visibility_flag_follows_category(post_with_published_location):
+    post = post_with_published_location
+    category = post.category
+    assert post.is_visible
+
+    category.is_published = False
+    category.save()
+    post.refresh_from_db()
+    assert not post.is_visible, (
+        "Убедитесь, что при снятии категории с публикации её посты "
+        "пропадают из лент."
+    )
+
+    category.is_published = True
+    category.save()
+    post.refresh_from_db()
+    assert post.is_visible
+
+    category.delete()
+    post.refresh_from_db()
+    assert post.category is None and not post.is_visible
+
+
+def test_feed_count_is_cached_and_invalidated(
+    mixer: Mixer, user_client, user, published_category, many_published_posts
+):
+    def count_queries(url):
+        with CaptureQueriesContext(connection) as queries:
+            response = user_client.get(url)
+        counts = [
+            q for q in queries.captured_queries if "COUNT(*)" in q["sql"]
+        ]
+        return response, len(counts)
+
+    for url in (
+        "/",
+        f"/category/{published_category.slug}/",
+        f"/profile/{user.username}/",
+    ):
+        count_queries(url)
+        response, n_counts = count_queries(url)
+        assert n_counts == 0, (
+            f"Убедитесь, что число публикаций ленты {url} берётся из кеша."
+        )
+        num_pages = response.context["page_obj"].paginator.num_pages
+
+        mixer.cycle(N_PER_PAGE).blend(
+            "blog.Post", author=user, category=published_category
+        )
+        response, n_counts = count_queries(url)
+        assert n_counts == 1
+        assert response.context["page_obj"].paginator.num_pages == (
+            num_pages + 1
+        ), f"Убедитесь, что кеш числа публикаций ленты {url} сбрасывается."
+
+
+def test_index_count_follows_category_publication(
+    mixer: Mixer, user_client, user, published_category, another_category
+):
+    mixer.cycle(10).blend(
+        "blog.Post", author=user, category=published_category
+    )
+    mixer.cycle(5).blend("blog.Post", author=user, category=another_category)
+    paginator = user_client.get("/").context["page_obj"].paginator
+    assert paginator.count == 15
+
+    published_category.is_published = False
+    published_category.save()
+    page_obj = user_client.get("/").context["page_obj"]
+    assert page_obj.paginator.count == len(page_obj) == 5, (
+        "Убедитесь, что снятие категории с публикации сбрасывает "
+        "кешированное число публикаций главной страницы."
+    )
+
+
+def test_paginator_renders_windowed_page_range():
+    from django.template.loader import render_to_string
+
+    from blog.paginators import FeedPaginator
+
+    def render(n_pages):
+        paginator = FeedPaginator(range(n_pages * N_PER_PAGE), N_PER_PAGE)
+        page_obj = paginator.page(5)
+        started = time.perf_counter()
+        for _ in range(20):
+            html = render_to_string(
+                "includes/paginator.html", {"page_obj": page_obj}
+            )
+        return html, time.perf_counter() - started
+
+    small_html, _ = render(20)
+    large_html, large_time = render(1_000_000)
+    _, reference_time = render(20)
+    assert small_html.count("<li") == large_html.count("<li"), (
+        "Убедитесь, что пагинатор выводит ограниченное окно страниц, "
+        "а не ссылку на каждую страницу."
+    )
+    assert large_html.count("<li") < 20
+    assert large_time < reference_time * 5 + 0.05
+
+
+def test_post_cards_are_served_from_fragment_cache(
+    user_client, post_with_published_location
+):
+    def rendered_templates():
+        response = user_client.get("/")
+        return response, {template.name for template in response.templates}
+
+    _, cold = rendered_templates()
+    assert "includes/category_link.html" in cold
+    _, warm = rendered_templates()
+    assert "includes/category_link.html" not in warm, (
+        "Убедитесь, что карточки постов берутся из кеша фрагментов."
+    )
+
+    category = post_with_published_location.category
+    category.title = "Обновлённая категория"
+    category.save()
+    response, refreshed = rendered_templates()
+    assert "includes/category_link.html" in refreshed
+    assert category.title in response.content.decode("utf-8"), (
+        "Убедитесь, что кеш карточки сбрасывается при изменении категории."
+    )
+
+
+def test_anonymous_feed_pages_are_cached(
+    mixer: Mixer,
+    client,
+    user,
+    another_user,
+    published_category,
+    post_with_published_location,
+    post_of_another_author,
+):
+    urls = {
+        "index": "/",
+        "category": f"/category/{published_category.slug}/",
+        "author": f"/profile/{user.username}/",
+        "another_author": f"/profile/{another_user.username}/",
+    }
+    for url in urls.values():
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert not queries.captured_queries, (
+            f"Убедитесь, что анонимным читателям страница {url} отдаётся "
+            "из кеша без запросов к базе данных."
+        )
+
+    post = mixer.blend("blog.Post", author=user, category=published_category)
+    for name, url in urls.items():
+        content = client.get(url).content.decode("utf-8")
+        if name == "another_author":
+            assert post.title not in content
+        else:
+            assert post.title in content, (
+                f"Убедитесь, что кеш страницы {url} сбрасывается при "
+                "публикации поста."
+            )
+    with CaptureQueriesContext(connection) as queries:
+        client.get(urls["another_author"])
+    assert not queries.captured_queries, (
+        "Убедитесь, что публикация поста не сбрасывает кеш лент, "
+        "в которые он не попадает."
+    )
+
+
+def test_only_card_changes_of_authors_drop_feed_caches(
+    mixer: Mixer, user, post_with_published_location
+):
+    from django.contrib.auth import get_user_model
+
+    from blog.cache import feed_versions
+
+    versions = feed_versions()
+    get_user_model().objects.create_user("newcomer", password="secret")
+    user.set_password("another secret")
+    user.save()
+    without_posts = mixer.blend("auth.User")
+    without_posts.username = "lonely"
+    without_posts.save()
+    assert feed_versions() == versions, (
+        "Убедитесь, что регистрация, смена пароля и правки пользователей "
+        "без публикаций не сбрасывают кеш лент."
+    )
+    user.username = "renamed"
+    user.save()
+    assert feed_versions() != versions, (
+        "Убедитесь, что смена имени автора сбрасывает кеш лент."
+    )
+
+
+def test_renamed_commenter_shows_on_cached_post_page(
+    mixer: Mixer, client, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.blend("blog.Comment", post=post, author=another_user)
+    url = f"/posts/{post.id}/"
+    etag = client.get(url)["ETag"]
+    another_user.username = "renamed_commenter"
+    another_user.save()
+    response = client.get(url)
+    assert "@renamed_commenter" in response.content.decode("utf-8"), (
+        "Убедитесь, что смена имени комментатора сбрасывает кеш страницы "
+        "публикации."
+    )
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_profile_edits_drop_cached_profile(user, user_client, client):
+    url = f"/profile/{user.username}/"
+    client.get(url)
+    response = user_client.post(
+        "/profile/edit/",
+        {
+            "first_name": "Новое",
+            "last_name": "Имя",
+            "username": user.username,
+            "date_joined": user.date_joined.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    )
+    assert response.status_code == 302
+    assert "Новое Имя" in client.get(url).content.decode("utf-8"), (
+        "Убедитесь, что правка профиля сбрасывает кеш страницы профиля."
+    )
+
+
+def test_reassigned_post_leaves_previous_author_profile(
+    client, user, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    url = f"/profile/{user.username}/"
+    assert post.title in client.get(url).content.decode("utf-8")
+    post.author = another_user
+    post.save()
+    assert post.title not in client.get(url).content.decode("utf-8"), (
+        "Убедитесь, что смена автора публикации сбрасывает кеш профиля "
+        "прежнего автора."
+    )
+
+
+def test_feed_cache_expires_at_next_scheduled_post(
+    mixer: Mixer, user, published_category, another_category
+):
+    from django.utils import timezone
+
+    from blog.cache import (
+        FEED_PAGE_TIMEOUT,
+        INDEX_FEED,
+        author_feed,
+        category_feed,
+        feed_timeout,
+    )
+
+    mixer.blend(
+        "blog.Post",
+        author=user,
+        category=published_category,
+        pub_date=timezone.now() + timezone.timedelta(seconds=30),
+    )
+    for feed in (
+        INDEX_FEED,
+        category_feed(published_category.slug),
+        author_feed(user.username),
+    ):
+        assert 0 < feed_timeout(feed, FEED_PAGE_TIMEOUT) <= 30, (
+            "Убедитесь, что кеш ленты истекает к моменту выхода "
+            "отложенной публикации."
+        )
+    assert (
+        feed_timeout(category_feed(another_category.slug), FEED_PAGE_TIMEOUT)
+        == FEED_PAGE_TIMEOUT
+    )
+    assert (
+        feed_timeout(author_feed(user.username, True), FEED_PAGE_TIMEOUT)
+        == FEED_PAGE_TIMEOUT
+    )
+
+
+def test_page_cache_timeout_is_taken_before_rendering(
+    mixer: Mixer, rf, user, published_category, monkeypatch
+):
+    from django.contrib.auth.models import AnonymousUser
+    from django.http import HttpResponse
+    from django.utils import timezone
+
+    import blog.cache
+    from blog.cache import FEED_PAGE_TIMEOUT, INDEX_FEED, cache_anonymous_page
+
+    started = timezone.now()
+    mixer.blend(
+        "blog.Post",
+        author=user,
+        category=published_category,
+        pub_date=started + timezone.timedelta(seconds=30),
+    )
+    clock = [started]
+    monkeypatch.setattr(blog.cache.timezone, "now", lambda: clock[0])
+    timeouts = []
+    monkeypatch.setattr(
+        blog.cache.cache,
+        "set",
+        lambda key, value, timeout: timeouts.append(timeout),
+    )
+
+    @cache_anonymous_page(lambda: INDEX_FEED)
+    def view(request):
+        # The scheduled post goes live while the page renders.
+        clock[0] = started + timezone.timedelta(minutes=1)
+        return HttpResponse("feed")
+
+    request = rf.get("/")
+    request.user = AnonymousUser()
+    view(request)
+    assert timeouts and timeouts[0] < FEED_PAGE_TIMEOUT, (
+        "Убедитесь, что срок кеша страницы считается до её отрисовки."
+    )
+
+
+def test_repeat_visits_get_not_modified(
+    mixer: Mixer, user_client, published_category, post_with_published_location
+):
+    post = post_with_published_location
+    urls = ("/", f"/category/{published_category.slug}/", f"/posts/{post.id}/")
+    etags = {}
+    for url in urls:
+        user_client.get(url)
+        response = user_client.get(url)
+        assert response.has_header("ETag"), (
+            f"Убедитесь, что страница {url} отдаёт ETag."
+        )
+        etags[url] = response["ETag"]
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+        assert response.status_code == 304, (
+            f"Убедитесь, что повторный запрос страницы {url} с совпадающим "
+            "ETag получает ответ 304."
+        )
+        assert not response.content
+
+    mixer.blend("blog.Comment", post=post)
+    for url in urls:
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+        assert response.status_code == 200, (
+            f"Убедитесь, что ETag страницы {url} меняется при добавлении "
+            "комментария."
+        )
+
+
+def test_feed_pages_are_not_validated_by_date(
+    mixer: Mixer, user_client, user, published_category
+):
+    posts = mixer.cycle(2).blend(
+        "blog.Post", author=user, category=published_category
+    )
+    post_response = user_client.get(f"/posts/{posts[0].id}/")
+    assert post_response.has_header("Last-Modified")
+    since = post_response["Last-Modified"]
+    user_client.get("/")
+    assert not user_client.get("/").has_header("Last-Modified"), (
+        "Убедитесь, что ленты не отдают Last-Modified: после удаления "
+        "поста дата оставшихся не становится новее."
+    )
+    posts[1].delete()
+    response = user_client.get("/", HTTP_IF_MODIFIED_SINCE=since)
+    assert response.status_code == 200
+
+
+def test_profile_etag_covers_profile_fields(user, user_client):
+    from django.contrib.auth import get_user_model
+
+    url = f"/profile/{user.username}/"
+    etag = user_client.get(url)["ETag"]
+    assert user_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    # Past the signals, so only the ETag itself can notice.
+    get_user_model().objects.filter(pk=user.pk).update(first_name="Другое")
+    response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200, (
+        "Убедитесь, что ETag профиля меняется при правке имени."
+    )
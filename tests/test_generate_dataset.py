@@ -0,0 +1,68 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Sum
+from django.utils import timezone
+
+pytestmark = [pytest.mark.django_db]
+
+
+def generate(**options):
+    options = {
+        "users": 5,
+        "categories": 4,
+        "locations": 3,
+        "posts": 40,
+        "comments": 200,
+        "seed": 7,
+        "batch_size": 16,
+        "scheduled": 0.25,
+        "unpublished": 0.25,
+        **options,
+    }
+    call_command("generate_dataset", stdout=StringIO(), **options)
+
+
+def test_generated_dataset_is_consistent():
+    from blog.models import Category, Comment, Post
+
+    generate()
+    posts = Post.objects.all()
+    assert posts.count() == 40 and Comment.objects.count() == 200
+    assert posts.aggregate(total=Sum("comment_count"))["total"] == 200, (
+        "Убедитесь, что счётчики комментариев сгенерированных постов "
+        "совпадают с числом комментариев."
+    )
+    for post in posts.select_related("category"):
+        assert post.comment_count == post.comments.count()
+        assert post.is_visible == (
+            post.is_published and post.category.is_published
+        )
+    assert posts.filter(pub_date__gt=timezone.now()).exists()
+    assert posts.filter(is_published=False).exists()
+    assert Category.objects.filter(is_published=True).exists()
+
+
+def test_generated_dataset_is_deterministic():
+    from blog.models import Post
+
+    def titles(posts):
+        return list(
+            posts.order_by("pk").values_list("title", "text", "pub_date")
+        )
+
+    generate(epoch="2026-01-01T00:00:00+00:00")
+    first = titles(Post.objects.all())
+    generate(epoch="2026-01-01T00:00:00+00:00")
+    second = titles(Post.objects.filter(pk__gt=40))
+    assert (
+        first == second
+    ), "Убедитесь, что при одинаковом --seed генерируются одинаковые данные."
+
+
+def test_posts_need_users_and_categories():
+    from django.core.management import CommandError
+
+    with pytest.raises(CommandError):
+        generate(users=0, categories=0)
@@ -0,0 +1,172 @@
+import json
+from io import BytesIO, StringIO
+
+import pytest
+from bs4 import BeautifulSoup
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from PIL import Image
+
+from blog.images import modern_formats, rendition_name
+
+pytestmark = [pytest.mark.django_db]
+
+
+def jpeg(width, height, orientation=None):
+    image = Image.new("RGB", (width, height), (200, 80, 40))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, "JPEG", exif=exif)
+    return output.getvalue()
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def process_images():
+    call_command("process_images", once=True, stdout=StringIO())
+
+
+def test_renditions_are_made_by_the_worker(
+    media_root, client, post_with_published_location
+):
+    post = post_with_published_location
+    post.image.save("photo.jpg", ContentFile(jpeg(1000, 600)))
+    post.refresh_from_db()
+    assert post.image_renditions is None, (
+        "Убедитесь, что загруженная картинка ставится в очередь, а не "
+        "обрабатывается во время запроса."
+    )
+
+    process_images()
+    post.refresh_from_db()
+    formats = modern_formats()
+    renditions = dict(post.image_renditions)
+    assert renditions.pop("placeholder").startswith("data:image/")
+    color = renditions.pop("color")
+    assert all(
+        abs(int(color[i : i + 2], 16) - channel) <= 4
+        for i, channel in zip((1, 3, 5), (200, 80, 40))
+    ), "Убедитесь, что сохраняется основной цвет картинки."
+    assert renditions == {
+        "width": 1000,
+        "height": 600,
+        "widths": [320, 640, 960, 1000],
+        "formats": formats,
+    }, "Убедитесь, что копии делаются только уже оригинала."
+    for width in post.image_renditions["widths"]:
+        for image_format in [None, *formats]:
+            if image_format is None and width == 1000:
+                continue
+            path = media_root / rendition_name(
+                post.image.name, width, image_format
+            )
+            with Image.open(path) as image:
+                assert image.size == (width, round(600 * width / 1000))
+                assert not image.getexif()
+
+    content = client.get(f"/posts/{post.id}/").content.decode("utf-8")
+    picture = BeautifulSoup(content, features="html.parser").picture
+    assert len(picture.find_all("img")) == 1
+    assert [source["type"] for source in picture.find_all("source")] == [
+        f"image/{image_format.lower()}" for image_format in formats
+    ]
+    assert f"{rendition_name(post.image.url, 640)} 640w" in (
+        picture.img["srcset"]
+    )
+    assert f"{post.image.url} 1000w" in picture.img["srcset"]
+    assert (picture.img["width"], picture.img["height"]) == ("1000", "600")
+    assert picture.img["loading"] == "eager"
+    assert color in picture.img["style"]
+
+
+def test_rotated_upload_is_measured_upright(
+    media_root, post_with_published_location
+):
+    post = post_with_published_location
+    post.image.save("portrait.jpg", ContentFile(jpeg(1000, 600, 6)))
+    process_images()
+    post.refresh_from_db()
+    assert post.image_renditions["widths"] == [320, 600]
+    assert post.image_renditions["height"] == 1000
+    path = media_root / rendition_name(post.image.name, 320)
+    with Image.open(path) as image:
+        assert image.size == (320, round(1000 * 320 / 600))
+
+
+def test_broken_upload_leaves_the_queue(
+    media_root, post_with_published_location
+):
+    post = post_with_published_location
+    post.image.save("broken.jpg", ContentFile(b"not an image"))
+    process_images()
+    post.refresh_from_db()
+    assert post.image_renditions == {}
+
+
+def test_image_savings_report(tmp_path):
+    for index, size in enumerate(((1600, 1200), (500, 400))):
+        (tmp_path / f"{index}.jpg").write_bytes(jpeg(*size))
+    (tmp_path / "0.640w.jpg").write_bytes(jpeg(640, 480))
+    output = tmp_path / "savings.json"
+    call_command(
+        "image_savings", str(tmp_path), output=output, stdout=StringIO()
+    )
+    results = json.loads(output.read_text())
+    assert results["images"] == 2
+    assert set(results["formats"]) == {"own", *modern_formats()}
+    for result in results["formats"].values():
+        assert result["bytes"] > 0
+
+
+def test_image_savings_skips_broken_images(tmp_path):
+    (tmp_path / "0.jpg").write_bytes(jpeg(500, 400))
+    (tmp_path / "1.jpg").write_bytes(b"not an image")
+    output = tmp_path / "savings.json"
+    call_command(
+        "image_savings",
+        str(tmp_path),
+        output=output,
+        stdout=StringIO(),
+        stderr=StringIO(),
+    )
+    assert json.loads(output.read_text())["images"] == 1, (
+        "Убедитесь, что в отчёт попадают только открытые картинки."
+    )
+
+    (tmp_path / "0.jpg").unlink()
+    with pytest.raises(CommandError):
+        call_command(
+            "image_savings",
+            str(tmp_path),
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+
+def test_only_first_card_loads_eagerly(
+    media_root, client, mixer, user, published_category
+):
+    for index in range(3):
+        post = mixer.blend(
+            "blog.Post", author=user, category=published_category
+        )
+        post.image.save(f"{index}.jpg", ContentFile(jpeg(700, 400)))
+    process_images()
+    content = client.get("/").content.decode("utf-8")
+    loading = [
+        img["loading"]
+        for img in BeautifulSoup(content, features="html.parser").select(
+            "article img"
+        )
+    ]
+    assert loading == [
+        "eager",
+        "lazy",
+        "lazy",
+    ], "Убедитесь, что картинки ниже первой карточки загружаются лениво."
@@ -0,0 +1,148 @@
+import json
+import re
+import threading
+
+import pytest
+
+from blog import metrics
+
+pytestmark = [pytest.mark.django_db]
+
+
+def sample(text, name, **labels):
+    """Value of one sample in the exposition, 0 when it is absent."""
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if not match or match[1] != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match[2] or ""))
+        if found == {key: str(value) for key, value in labels.items()}:
+            return float(match[3])
+    return 0
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    return response.content.decode("utf-8")
+
+
+def test_metrics_are_labelled_by_view(
+    client, user_client, post_with_published_location
+):
+    before = scrape(client)
+    client.get("/")
+    user_client.get(f"/posts/{post_with_published_location.id}/")
+    after = scrape(client)
+
+    for view, method in (("blog:index", "GET"), ("blog:post_detail", "GET")):
+        name = "blogicum_request_duration_seconds_count"
+        assert sample(after, name, view=view, method=method) == (
+            sample(before, name, view=view, method=method) + 1
+        ), f"Убедитесь, что запросы к {view} попадают в гистограмму."
+        assert sample(
+            after,
+            "blogicum_request_duration_seconds_bucket",
+            view=view,
+            method=method,
+            le="+Inf",
+        ) == sample(after, name, view=view, method=method)
+        assert sample(after, "blogicum_db_queries_sum", view=view) > sample(
+            before, "blogicum_db_queries_sum", view=view
+        )
+        assert sample(
+            after, "blogicum_template_render_seconds_sum", view=view
+        ) > sample(before, "blogicum_template_render_seconds_sum", view=view)
+    assert (
+        sample(
+            after,
+            "blogicum_requests_total",
+            view="blog:index",
+            method="GET",
+            status=200,
+        )
+        == sample(
+            before,
+            "blogicum_requests_total",
+            view="blog:index",
+            method="GET",
+            status=200,
+        )
+        + 1
+    )
+
+
+def test_unknown_methods_share_one_label(client):
+    before = scrape(client)
+    client.generic("FOOBAR", "/")
+    client.generic("BAZ", "/")
+    after = scrape(client)
+    name = "blogicum_request_duration_seconds_count"
+    assert 'method="FOOBAR"' not in after, (
+        "Убедитесь, что нестандартные методы HTTP не создают новых меток."
+    )
+    assert sample(after, name, view="blog:index", method="other") == (
+        sample(before, name, view="blog:index", method="other") + 2
+    )
+
+
+def test_metrics_are_closed_to_other_addresses(client, settings):
+    settings.METRICS_ALLOWED_IPS = ["10.0.0.1"]
+    assert client.get("/metrics").status_code == 403
+
+
+def test_threads_record_into_their_own_shards():
+    labels = (("view", "test:threads"),)
+
+    def record():
+        for _ in range(1000):
+            metrics.shard().observe("blogicum_db_queries", labels, 1)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _, histograms = metrics.snapshot()
+    histogram = histograms["blogicum_db_queries", labels]
+    assert sum(histogram[:-1]) == 4000
+    assert histogram[metrics.QUERY_BUCKETS.index(1)] == 4000
+
+
+def test_multiprocess_mode_sums_worker_files(client, settings, tmp_path):
+    settings.METRICS_MULTIPROCESS_DIR = str(tmp_path)
+    (tmp_path / "1.json").write_text(
+        json.dumps(
+            {
+                "counters": [
+                    [
+                        "blogicum_requests_total",
+                        [
+                            ["view", "test:worker"],
+                            ["method", "GET"],
+                            ["status", 200],
+                        ],
+                        7,
+                    ]
+                ],
+                "histograms": [],
+            }
+        )
+    )
+    text = scrape(client)
+    assert (
+        sample(
+            text,
+            "blogicum_requests_total",
+            view="test:worker",
+            method="GET",
+            status=200,
+        )
+        == 7
+    )
+    assert (
+        tmp_path / f"{metrics.os.getpid()}.json"
+    ).exists(), (
+        "Убедитесь, что процесс сохраняет свои метрики в общий каталог."
+    )
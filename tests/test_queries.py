@@ -0,0 +1,175 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import Mixer
+
+pytestmark = [pytest.mark.django_db]
+
+
+def blog_queries(queries):
+    return [q["sql"] for q in queries.captured_queries if "blog_" in q["sql"]]
+
+
+def test_post_detail_query_count(
+    mixer: Mixer, user_client, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.cycle(5).blend("blog.Comment", post=post, author=another_user)
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.get(f"/posts/{post.id}/")
+    assert response.status_code == 200
+    assert len(blog_queries(queries)) <= 2, (
+        "Убедитесь, что страница публикации загружает пост со связанными "
+        "объектами и комментарии не более чем двумя запросами:\n"
+        + "\n".join(blog_queries(queries))
+    )
+    assert len(queries.captured_queries) <= 4
+
+
+def test_post_comments_are_paginated(
+    mixer: Mixer, user_client, another_user, post_with_published_location
+):
+    from blog.views import COMMENTS_PER_PAGE
+
+    post = post_with_published_location
+    comments = mixer.cycle(COMMENTS_PER_PAGE * 2 + 5).blend(
+        "blog.Comment", post=post, author=another_user
+    )
+    expected = [
+        comment.id
+        for comment in sorted(comments, key=lambda c: (c.created_at, c.id))
+    ]
+
+    page = user_client.get(f"/posts/{post.id}/").context["comments"]
+    assert len(page) == COMMENTS_PER_PAGE, (
+        "Убедитесь, что на странице публикации выводится ограниченное "
+        "число комментариев."
+    )
+    loaded = [comment.id for comment in page]
+    while page.has_next():
+        with CaptureQueriesContext(connection) as queries:
+            response = user_client.get(
+                f"/posts/{post.id}/comments/", {"cursor": page.next_cursor}
+            )
+        assert response.status_code == 200
+        assert len(blog_queries(queries)) <= 2
+        page = response.context["comments"]
+        loaded += [comment.id for comment in page]
+    assert loaded == expected, (
+        "Убедитесь, что подгрузка комментариев по курсору выдаёт все "
+        "комментарии по порядку."
+    )
+
+
+def test_anonymous_post_detail_is_public_and_cached(
+    mixer: Mixer,
+    client,
+    user_client,
+    user,
+    another_user,
+    post_with_published_location,
+):
+    post = post_with_published_location
+    comment = mixer.blend("blog.Comment", post=post, author=user)
+    url = f"/posts/{post.id}/"
+
+    response = client.get(url)
+    assert response.status_code == 200, (
+        "Убедитесь, что опубликованный пост доступен анонимным читателям."
+    )
+    content = response.content.decode("utf-8")
+    assert "csrfmiddlewaretoken" not in content
+    assert f"/posts/{post.id}/edit/" not in content
+    assert f"/edit_comment/{comment.id}/" not in content
+
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    assert not queries.captured_queries, (
+        "Убедитесь, что страница поста для анонимных читателей кешируется."
+    )
+
+    comment.text = "Исправленный комментарий"
+    comment.save()
+    assert comment.text in client.get(url).content.decode("utf-8")
+
+    owner_content = user_client.get(url).content.decode("utf-8")
+    assert f"/posts/{post.id}/edit/" in owner_content
+    assert f"/edit_comment/{comment.id}/" in owner_content
+
+    post.is_published = False
+    post.save()
+    assert client.get(url).status_code == 404
+
+
+def test_query_budget_flags_n_plus_one(mixer: Mixer, user):
+    from django.template import engines
+
+    from blog.models import Post
+    from blog.query_budget import QueryBudgetExceeded, assert_query_budget
+
+    mixer.cycle(4).blend("blog.Post", author=mixer.blend("auth.User"))
+    template = engines["django"].from_string(
+        "{% for post in posts %}{{ post.author.username }}{% endfor %}"
+    )
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with assert_query_budget(10, "Лента"):
+            template.render({"posts": Post.objects.all()})
+    assert "N+1: 4 ×" in str(error.value), (
+        "Убедитесь, что повторяющиеся запросы распознаются как N+1."
+    )
+    with assert_query_budget(1):
+        template.render(
+            {"posts": Post.objects.select_related("author")}
+        )
+
+
+def test_view_over_query_budget_fails(
+    user_client, post_with_published_location, monkeypatch
+):
+    from blog.query_budget import QueryBudgetExceeded
+    from blog.views import PostDetailView
+
+    monkeypatch.setattr(PostDetailView, "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        user_client.get(f"/posts/{post_with_published_location.id}/")
+
+
+def test_post_delete_skips_per_comment_upkeep(
+    mixer: Mixer, user, user_client, another_user, post_with_published_location
+):
+    post = post_with_published_location
+    mixer.cycle(10).blend("blog.Comment", post=post, author=another_user)
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.post(f"/posts/{post.id}/delete/")
+    assert response.status_code == 302
+    assert not post.__class__.objects.filter(pk=post.pk).exists()
+    assert not any(
+        'SET "comment_count"' in q["sql"] for q in queries.captured_queries
+    ), "Убедитесь, что удаление публикации не пересчитывает её комментарии."
+
+
+def test_failed_post_delete_keeps_comment_upkeep(
+    mixer: Mixer, another_user, post_with_published_location, monkeypatch
+):
+    from django.db import transaction
+
+    from blog.models import Post
+
+    post = post_with_published_location
+    comments = mixer.cycle(2).blend(
+        "blog.Comment", post=post, author=another_user
+    )
+
+    def fail(*args, **kwargs):
+        raise RuntimeError
+
+    with monkeypatch.context() as patch:
+        patch.setattr("django.db.models.sql.DeleteQuery.delete_batch", fail)
+        with pytest.raises(RuntimeError), transaction.atomic():
+            Post.objects.get(pk=post.pk).delete()
+    comments[0].delete()
+    post.refresh_from_db()
+    assert post.comment_count == 1, (
+        "Убедитесь, что неудачное удаление публикации не отключает "
+        "пересчёт её комментариев."
+    )
@@ -0,0 +1,81 @@
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from blog import resize
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def source(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / "media"
+    settings.RESIZE_CACHE_ROOT = tmp_path / "cache"
+    path = settings.MEDIA_ROOT / "posts_images" / "photo.jpg"
+    path.parent.mkdir(parents=True)
+    Image.new("RGB", (1000, 600), (10, 120, 200)).save(path)
+    return path
+
+
+def get_image(response):
+    assert response.status_code == 200
+    with Image.open(BytesIO(b"".join(response.streaming_content))) as image:
+        return image.size
+
+
+def test_resized_copy_is_made_once_and_cached(
+    client, source, settings, monkeypatch
+):
+    url = "/media/resize/640x0/posts_images/photo.jpg"
+    response = client.get(url)
+    assert get_image(response) == (640, 384)
+    assert "max-age=31536000" in response["Cache-Control"]
+    assert "immutable" in response["Cache-Control"]
+    copies = list(settings.RESIZE_CACHE_ROOT.glob("*/*/*.jpg"))
+    assert len(copies) == 1, "Убедитесь, что копии хранятся по подкаталогам."
+
+    def render(*args):
+        raise AssertionError("Копия должна браться из кеша на диске.")
+
+    monkeypatch.setattr(resize, "render", render)
+    assert get_image(client.get(url)) == (640, 384)
+    response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/media/resize/123x0/posts_images/photo.jpg",
+        "/media/resize/640x0/posts_images/missing.jpg",
+        "/media/resize/640x0/posts_images/../posts_images/../photo.jpg",
+    ],
+)
+def test_unknown_sizes_and_paths_are_not_found(client, source, url):
+    assert client.get(url).status_code == 404
+
+
+def test_pool_coalesces_and_bounds_resizes(source, settings, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def render(*args):
+        calls.append(args)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(resize, "render", render)
+    pool = resize.ResizePool(workers=1, max_pending=1)
+    target = resize.cache_path(source, 640, 0)
+    first = pool.submit(source, target, 640, 0)
+    started.wait(5)
+    assert pool.submit(source, target, 640, 0) is first, (
+        "Убедитесь, что одновременные запросы одной копии объединяются."
+    )
+    with pytest.raises(resize.Overloaded):
+        pool.submit(source, resize.cache_path(source, 320, 0), 320, 0)
+    release.set()
+    first.result(5)
+    assert len(calls) == 1
@@ -0,0 +1,119 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import Mixer
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def blend_post(mixer: Mixer, user, published_category):
+    def blend(**kwargs):
+        kwargs = {
+            "author": user,
+            "category": published_category,
+            "is_published": True,
+            "pub_date": timezone.now() - timezone.timedelta(days=1),
+            "text": "Без особых примет.",
+            **kwargs,
+        }
+        return mixer.blend("blog.Post", **kwargs)
+
+    return blend
+
+
+def found_ids(client, query, **params):
+    response = client.get("/search/", {"q": query, **params})
+    assert response.status_code == 200
+    return [post.id for post in response.context["page_obj"]]
+
+
+def test_search_ranks_visible_posts(client, blend_post):
+    in_text = blend_post(title="Заметки", text="Зимой мы наряжали ёлку.")
+    in_title = blend_post(title="Новогодняя ёлка")
+    blend_post(title="Ёлка-черновик", is_published=False)
+    blend_post(
+        title="Ёлка из будущего",
+        pub_date=timezone.now() + timezone.timedelta(days=1),
+    )
+    blend_post(title="Про кошек")
+
+    assert found_ids(client, "ЕЛКИ") == [in_title.id, in_text.id], (
+        "Убедитесь, что поиск находит опубликованные посты без учёта "
+        "регистра, буквы «ё» и окончаний, а совпадения в заголовке "
+        "ставит выше."
+    )
+    assert found_ids(client, '"; DROP TABLE') == []
+
+
+def test_search_index_follows_posts(client, blend_post):
+    post = blend_post(title="Прогулка по набережной")
+    assert found_ids(client, "набережная") == [post.id]
+
+    post.title = "Прогулка по парку"
+    post.save()
+    assert found_ids(client, "набережная") == []
+    assert found_ids(client, "парк") == [post.id]
+
+    type(post).objects.update(title="Поход в горы")
+    call_command("rebuild_search_index", stdout=StringIO())
+    assert found_ids(client, "горы") == [post.id]
+
+    post.delete()
+    assert found_ids(client, "горы") == []
+
+
+def test_search_is_paginated(client, blend_post):
+    from conftest import N_PER_PAGE
+
+    posts = [
+        blend_post(title=f"Поход номер {i}") for i in range(N_PER_PAGE + 3)
+    ]
+    first = found_ids(client, "поход")
+    second = found_ids(client, "поход", page=2)
+    assert len(first) == N_PER_PAGE
+    assert sorted(first + second) == sorted(post.id for post in posts)
+    content = client.get("/search/", {"q": "поход"}).content.decode("utf-8")
+    assert (
+        "?q=%D0%BF%D0%BE%D1%85%D0%BE%D0%B4&amp;page=2" in content
+    ), "Убедитесь, что ссылки пагинатора сохраняют поисковый запрос."
+
+
+def test_admin_search_uses_index(admin_client, blend_post):
+    post = blend_post(title="Поездка на дачу")
+    blend_post(title="Другое")
+    response = admin_client.get("/admin/blog/post/", {"q": "дачи"})
+    assert list(response.context["cl"].result_list) == [post]
+
+
+def test_autocomplete_tolerates_typos(client, mixer: Mixer, blend_post):
+    post = blend_post(title="Публикация о путешествии")
+    blend_post(title="Публикация-черновик", is_published=False)
+    blend_post(title="Совсем другое")
+    member = mixer.blend("auth.User", username="Алёна_Смирнова")
+
+    data = client.get("/autocomplete/", {"q": "публикаця"}).json()
+    assert [item["title"] for item in data["posts"]] == [post.title], (
+        "Убедитесь, что подсказки находят опубликованные посты по "
+        "заголовку с опечаткой."
+    )
+    assert data["posts"][0]["url"] == f"/posts/{post.id}/"
+
+    data = client.get("/autocomplete/", {"q": "алена смирнва"}).json()
+    assert data["users"] == [
+        {
+            "username": member.username,
+            "url": reverse("blog:profile", args=[member.username]),
+        }
+    ], "Убедитесь, что подсказки находят пользователей с опечаткой."
+
+    member.username = "Другое_имя"
+    member.save()
+    assert not client.get("/autocomplete/", {"q": "смирнова"}).json()["users"]
+    assert client.get("/autocomplete/", {"q": "ab"}).json() == {
+        "posts": [],
+        "users": [],
+    }
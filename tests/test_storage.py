@@ -0,0 +1,166 @@
+from io import BytesIO, StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from PIL import Image
+
+from blog.images import rendition_name
+from blog.management.commands.migrate_media_storage import Command
+from blog.models import MediaFile, Post
+from blog.storage import is_content_name
+
+pytestmark = [pytest.mark.django_db]
+
+
+def jpeg(color):
+    output = BytesIO()
+    Image.new("RGB", (400, 300), color).save(output, "JPEG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def references(name):
+    media_file = MediaFile.objects.filter(name=name).first()
+    return media_file and media_file.references
+
+
+def test_identical_uploads_share_one_file(
+    media_root,
+    mixer,
+    post_with_published_location,
+    django_capture_on_commit_callbacks,
+):
+    first = post_with_published_location
+    second = mixer.blend("blog.Post", author=first.author)
+    first.image.save("a.jpg", ContentFile(jpeg((200, 80, 40))))
+    second.image.save("b.JPG", ContentFile(jpeg((200, 80, 40))))
+    name = first.image.name
+    assert second.image.name == name and is_content_name(name), (
+        "Убедитесь, что одинаковые картинки хранятся в одном файле с "
+        "именем по хешу содержимого."
+    )
+    assert name.startswith(f"posts_images/{name[-68:-66]}/{name[-66:-64]}/")
+    assert [path.name for path in media_root.rglob("*.jpg")] == [
+        name.rsplit("/", 1)[1]
+    ]
+    assert references(name) == 2
+
+    call_command("process_images", once=True, stdout=StringIO())
+    copy = media_root / rendition_name(name, 320)
+    assert copy.is_file()
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert references(name) == 1
+    assert (media_root / name).is_file()
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert references(name) is None
+    assert not (media_root / name).exists() and not copy.exists(), (
+        "Убедитесь, что файл и его копии удаляются вместе с последней "
+        "публикацией, которая его использует."
+    )
+
+
+def test_duplicate_upload_reuses_renditions(
+    media_root, mixer, post_with_published_location
+):
+    first = post_with_published_location
+    first.image.save("a.jpg", ContentFile(jpeg((10, 120, 200))))
+    call_command("process_images", once=True, stdout=StringIO())
+    first.refresh_from_db()
+
+    second = mixer.blend("blog.Post", author=first.author)
+    second.image.save("b.jpg", ContentFile(jpeg((10, 120, 200))))
+    second.refresh_from_db()
+    assert second.image_renditions == first.image_renditions, (
+        "Убедитесь, что у повторно загруженной картинки сразу есть копии."
+    )
+
+
+def test_replacing_image_stays_in_query_budget(
+    media_root, user_client, post_with_published_location
+):
+    post = post_with_published_location
+    post.image.save("a.jpg", ContentFile(jpeg((0, 0, 0))))
+    old_name = post.image.name
+    response = user_client.post(
+        f"/posts/{post.id}/edit/",
+        {
+            "title": post.title,
+            "text": post.text,
+            "pub_date": timezone.localtime(post.pub_date).strftime(
+                "%Y-%m-%dT%H:%M"
+            ),
+            "category": post.category_id,
+            "location": post.location_id,
+            "is_published": True,
+            "image": SimpleUploadedFile(
+                "new.jpg", jpeg((255, 255, 255)), "image/jpeg"
+            ),
+        },
+    )
+    assert response.status_code == 302
+    post.refresh_from_db()
+    assert post.image.name != old_name
+    assert references(post.image.name) == 1
+    assert references(old_name) is None
+
+
+def test_migrate_media_storage(media_root, mixer, user):
+    legacy = media_root / "posts_images"
+    legacy.mkdir()
+    (legacy / "one.jpg").write_bytes(jpeg((1, 2, 3)))
+    (legacy / "two.jpg").write_bytes(jpeg((1, 2, 3)))
+    (legacy / "one.320w.jpg").write_bytes(b"copy")
+    renditions = {"width": 400, "widths": [320, 400], "formats": []}
+    posts = mixer.cycle(3).blend("blog.Post", author=user)
+    for post, name in zip(posts, ("one.jpg", "two.jpg", "two.jpg")):
+        Post.objects.filter(pk=post.pk).update(
+            image=f"posts_images/{name}", image_renditions=renditions
+        )
+
+    call_command("migrate_media_storage", batch_size=2, stdout=StringIO())
+    names = set(
+        Post.objects.filter(pk__in=[post.pk for post in posts]).values_list(
+            "image", flat=True
+        )
+    )
+    assert len(names) == 1, (
+        "Убедитесь, что команда переносит картинки в хранилище по хешу и "
+        "объединяет одинаковые файлы."
+    )
+    name = names.pop()
+    assert is_content_name(name)
+    assert (media_root / name).is_file()
+    assert (media_root / rendition_name(name, 320)).read_bytes() == b"copy"
+    assert not list(legacy.glob("*.jpg"))
+    assert references(name) == 3
+
+
+def test_migrate_media_storage_keeps_files_of_later_batches(
+    media_root, mixer, user
+):
+    legacy = media_root / "posts_images"
+    legacy.mkdir()
+    (legacy / "one.jpg").write_bytes(jpeg((4, 5, 6)))
+    (legacy / "one.320w.jpg").write_bytes(b"copy")
+    renditions = {"width": 400, "widths": [320, 400], "formats": []}
+    first, second = mixer.cycle(2).blend("blog.Post", author=user)
+    Post.objects.filter(pk__in=[first.pk, second.pk]).update(
+        image="posts_images/one.jpg", image_renditions=renditions
+    )
+    command = Command(stdout=StringIO(), stderr=StringIO())
+    command.migrate([(first.pk, "posts_images/one.jpg", renditions)])
+    assert (legacy / "one.jpg").is_file()
+    assert (legacy / "one.320w.jpg").is_file(), (
+        "Убедитесь, что команда не удаляет копии картинки, которую ещё "
+        "используют публикации следующих пачек."
+    )